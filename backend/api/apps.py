@@ -3,3 +3,13 @@ from django.apps import AppConfig
 
 class ApiConfig(AppConfig):
     name = 'api'
+
+    def ready(self):
+        from .v1 import (  # noqa: F401
+            authentication,
+            filters,
+            ingredient_index,
+            recipe_index,
+            response_cache,
+            versions
+        )
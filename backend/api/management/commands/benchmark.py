@@ -0,0 +1,337 @@
+import json
+import time
+from itertools import islice
+from random import Random
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+from api.management.commands.load_test import get_commit, percentile
+from api.v1 import recipe_index
+from api.v1.filters import TAGS_IDS_KEY
+from api.v1.pagination import RecipePagination
+from recipes.models import (
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    RecipeTag,
+    ShoppingCart,
+    ShoppingListItem,
+    Tag
+)
+from users.models import User
+
+CART_SIZES = (10, 100, 1000)
+PAGES = (1, 1000)
+INGREDIENTS_COUNT = 2000
+INGREDIENTS_PER_RECIPE = 8
+TAGS_COUNT = 5
+INGREDIENTS_QUERIES = (1, 3, 10)
+BATCH_SIZE = 500
+
+
+def bulk_create(model, objects):
+    """Сохраняет объекты порциями по BATCH_SIZE. QuerySet.bulk_create
+    сначала собирает все объекты в список, а для миллионов записей
+    он не помещается в память."""
+    objects = iter(objects)
+    while True:
+        batch = list(islice(objects, BATCH_SIZE))
+        if not batch:
+            return
+        model.objects.bulk_create(batch)
+
+
+def measure(client, url, token, repeat):
+    """Запрашивает url repeat раз и возвращает медиану и p95 времени
+    до первого фрагмента ответа (ttfb) и до конца ответа (total)."""
+    ttfb, total = [], []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(url, HTTP_AUTHORIZATION=f'Token {token}')
+        chunks = iter(
+            response.streaming_content if response.streaming
+            else [response.content]
+        )
+        size = len(next(chunks, b''))
+        ttfb.append(time.perf_counter() - started)
+        size += sum(map(len, chunks))
+        total.append(time.perf_counter() - started)
+    result = {'status': response.status_code, 'bytes': size}
+    for name, values in (('ttfb_ms', ttfb), ('total_ms', total)):
+        values.sort()
+        result[name] = {
+            f'p{rank}': round(percentile(values, rank) * 1000, 3)
+            for rank in (50, 95)
+        }
+    return result
+
+
+class SyntheticData:
+    """Синтетический набор данных: автор с рецептами, ингредиенты,
+    тэги и пользователи со списками покупок разного размера."""
+
+    def __init__(self, recipes_count, seed):
+        self.random = Random(seed)
+        self.author = self.create_user('author')
+        self.token = Token.objects.create(user=self.author).key
+        bulk_create(
+            Ingredient,
+            (
+                Ingredient(
+                    name=f'benchmark ingredient {number}',
+                    measurement_unit='г'
+                )
+                for number in range(INGREDIENTS_COUNT)
+            )
+        )
+        self.ingredients = list(Ingredient.objects.filter(
+            name__startswith='benchmark ingredient '
+        ).values_list('pk', flat=True))
+        Tag.objects.bulk_create(
+            Tag(
+                name=f'benchmark {number}',
+                color=f'#be{number:04x}',
+                slug=f'benchmark-{number}'
+            )
+            for number in range(TAGS_COUNT)
+        )
+        # bulk_create не отправляет сигналов, поэтому кешированное
+        # соответствие слагов тэгов их id сбрасывается вручную.
+        cache.delete(TAGS_IDS_KEY)
+        self.tags = list(Tag.objects.filter(
+            slug__startswith='benchmark-'
+        ).order_by('slug').values_list('pk', 'slug'))
+        bulk_create(
+            Recipe,
+            (
+                Recipe(
+                    author=self.author,
+                    name=f'Рецепт {number}',
+                    text='Синтетический рецепт для замеров.',
+                    image='recipes/images/benchmark.png',
+                    cooking_time=self.random.randint(1, 120)
+                )
+                for number in range(recipes_count)
+            )
+        )
+        self.recipes = list(Recipe.objects.filter(
+            author=self.author
+        ).order_by('pk').values_list('pk', flat=True))
+        bulk_create(
+            RecipeIngredient,
+            (
+                RecipeIngredient(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=self.random.randint(1, 500)
+                )
+                for recipe_id in self.recipes
+                for ingredient_id in self.random.sample(
+                    self.ingredients, INGREDIENTS_PER_RECIPE
+                )
+            )
+        )
+        bulk_create(
+            RecipeTag,
+            (
+                RecipeTag(recipe_id=recipe_id, tags_id=tag_id)
+                for recipe_id in self.recipes
+                for tag_id, _ in self.random.sample(
+                    self.tags, self.random.randint(1, 3)
+                )
+            )
+        )
+        self.carts = {size: self.create_cart(size) for size in CART_SIZES}
+
+    def create_user(self, name):
+        return User.objects.create_user(
+            email=f'benchmark-{name}@example.com',
+            username=f'benchmark-{name}',
+            first_name='Benchmark',
+            last_name=name,
+            password=None
+        )
+
+    def create_cart(self, size):
+        """Создает пользователя со списком покупок из size рецептов
+        и возвращает его токен. Сигналы при bulk_create не
+        отправляются, поэтому итоги списка считаются здесь
+        одним запросом по составу рецептов."""
+        user = self.create_user(f'cart-{size}')
+        recipes = self.random.sample(
+            self.recipes, min(size, len(self.recipes))
+        )
+        bulk_create(
+            ShoppingCart,
+            (ShoppingCart(user=user, recipe_id=pk) for pk in recipes)
+        )
+        totals = list(RecipeIngredient.objects.filter(
+            recipe__in=ShoppingCart.objects.filter(
+                user=user
+            ).values('recipe_id')
+        ).values_list('ingredient_id').annotate(total=Sum('amount')))
+        bulk_create(
+            ShoppingListItem,
+            (
+                ShoppingListItem(
+                    user=user, ingredient_id=ingredient_id, total=total
+                )
+                for ingredient_id, total in totals
+            )
+        )
+        return Token.objects.create(user=user).key, len(totals)
+
+
+class Command(BaseCommand):
+    """Замеры отдельных запросов на синтетических данных.
+    Сценарий shopping_list_pdf - время до первого байта и до конца
+    ответа при скачивании PDF-списка покупок из 10, 100 и 1000 рецептов.
+    Сценарий recipe_pages - первая и тысячная страница списка рецептов
+    при постраничной выдаче по номеру страницы и по курсору.
+    Сценарий tag_filters - первая страница списка рецептов
+    с фильтром по 1-5 тэгам.
+    Сценарий by_ingredients - построение индекса ингредиентов
+    и поиск рецептов по 1, 3 и 10 имеющимся ингредиентам.
+    Данные создаются в транзакции, которая в конце откатывается,
+    поэтому в базе после команды ничего не остается. Запросы
+    выполняются тестовым клиентом Django в текущем процессе."""
+
+    help = (
+        'Замеры запросов на синтетических данных. Выводит время '
+        'до первого байта и до конца ответа в JSON.'
+    )
+    scenarios = (
+        'shopping_list_pdf', 'recipe_pages', 'tag_filters', 'by_ingredients'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            choices=self.scenarios,
+            help='Сценарий замеров, можно указать несколько раз. '
+                 'По умолчанию выполняются все.'
+        )
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            default=20000,
+            help='Количество синтетических рецептов.'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=10,
+            help='Количество повторов каждого запроса.'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Начальное значение генератора случайных чисел.'
+        )
+        parser.add_argument(
+            '--output',
+            help='Файл для отчета, по умолчанию стандартный вывод.'
+        )
+
+    def handle(self, *args, **options):
+        report = {
+            'commit': get_commit(),
+            'database': connection.vendor,
+            'recipes': options['recipes'],
+            'repeat': options['repeat'],
+        }
+        client = Client()
+        with transaction.atomic():
+            data = SyntheticData(options['recipes'], options['seed'])
+            for scenario in options['scenario'] or self.scenarios:
+                report[scenario] = getattr(self, scenario)(
+                    client, data, options['repeat']
+                )
+            transaction.set_rollback(True)
+        cache.delete(TAGS_IDS_KEY)
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def shopping_list_pdf(self, client, data, repeat):
+        report = {}
+        for size, (token, rows) in data.carts.items():
+            report[f'{size}_recipes'] = {
+                'rows': rows,
+                **measure(
+                    client,
+                    '/api/recipes/download_shopping_cart/?format=pdf',
+                    token,
+                    repeat
+                ),
+            }
+        return report
+
+    def recipe_pages(self, client, data, repeat):
+        page_size = RecipePagination.page_size
+        report = {'offset': {}, 'cursor': {}}
+        for page in PAGES:
+            report['offset'][f'page_{page}'] = measure(
+                client, f'/api/recipes/?page={page}', data.token, repeat
+            )
+            # Курсор страницы - позиция последнего рецепта предыдущей.
+            cursor = ''
+            if page > 1:
+                cursor = RecipePagination.encode_cursor(
+                    Recipe.objects.order_by(
+                        '-pub_date', '-id'
+                    ).values_list('pub_date', 'id')[(page - 1) * page_size - 1]
+                )
+            report['cursor'][f'page_{page}'] = measure(
+                client, f'/api/recipes/?cursor={cursor}', data.token, repeat
+            )
+        return report
+
+    def tag_filters(self, client, data, repeat):
+        report = {}
+        for count in range(1, len(data.tags) + 1):
+            url = '/api/recipes/?' + urlencode([
+                ('tags', slug) for _, slug in data.tags[:count]
+            ])
+            found = json.loads(client.get(
+                url, HTTP_AUTHORIZATION=f'Token {data.token}'
+            ).content)['count']
+            if not found:
+                raise CommandError(
+                    f'Фильтр по {count} тэгам не нашел ни одного рецепта.'
+                )
+            report[f'{count}_tags'] = {
+                'count': found,
+                **measure(client, url, data.token, repeat),
+            }
+        return report
+
+    def by_ingredients(self, client, data, repeat):
+        started = time.perf_counter()
+        recipe_index.get_index(recipe_index.get_version())
+        report = {
+            'index_build_ms': round(
+                (time.perf_counter() - started) * 1000, 3
+            ),
+        }
+        for count in INGREDIENTS_QUERIES:
+            ingredients = data.random.sample(data.ingredients, count)
+            report[f'{count}_ingredients'] = measure(
+                client,
+                '/api/recipes/by_ingredients/?ingredients='
+                + ','.join(map(str, ingredients)),
+                data.token,
+                repeat
+            )
+        return report
@@ -0,0 +1,422 @@
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from random import Random
+from urllib.parse import urlencode
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+from api.metrics import QueryRecorder
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from users.models import User
+
+# Доли сценариев в нагрузке. Добавление в избранное и в список
+# покупок выполняется парой запросов POST и DELETE, поэтому данные
+# после прогона остаются прежними.
+SCENARIOS = {
+    'recipe_list': 40,
+    'recipe_detail': 20,
+    'ingredient_search': 15,
+    'favorite_toggle': 8,
+    'shopping_cart_toggle': 7,
+    'subscriptions': 7,
+    'shopping_list_download': 3,
+}
+PERCENTILES = (50, 95, 99)
+SERVER_TIMING_QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+GUNICORN_START_TIMEOUT = 30
+
+
+def percentile(values, rank):
+    """Процентиль по методу ближайшего ранга для отсортированного списка."""
+    return values[max(0, -(-len(values) * rank // 100) - 1)]
+
+
+def summarize(results):
+    """Сводка по списку (статус, время ответа, число SQL-запросов)."""
+    durations = sorted(duration for _, duration, _ in results)
+    queries = [count for _, _, count in results if count is not None]
+    summary = {
+        'requests': len(results),
+        'errors': sum(
+            1 for status, _, _ in results if not 200 <= status < 400
+        ),
+        'latency_ms': {
+            f'p{rank}': round(percentile(durations, rank) * 1000, 3)
+            for rank in PERCENTILES
+        },
+        'queries_per_request': (
+            round(sum(queries) / len(queries), 2) if queries else None
+        ),
+    }
+    summary['latency_ms']['mean'] = round(
+        sum(durations) / len(durations) * 1000, 3
+    )
+    summary['latency_ms']['max'] = round(durations[-1] * 1000, 3)
+    return summary
+
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class InProcessTransport:
+    """Отправляет запросы тестовым клиентом Django в текущем процессе.
+    SQL-запросы считаются оберткой соединения потока."""
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def send(self, method, url, token):
+        if not hasattr(self.local, 'client'):
+            self.local.client = Client()
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(recorder):
+                response = self.local.client.generic(
+                    method, url, HTTP_AUTHORIZATION=f'Token {token}'
+                )
+                body = (
+                    b''.join(response.streaming_content)
+                    if response.streaming else response.content
+                )
+            status = response.status_code
+        except Exception:
+            status, body = 500, b''
+        return status, time.perf_counter() - started, recorder.count, body
+
+    def close(self):
+        connection.close()
+
+
+class HttpTransport:
+    """Отправляет запросы по HTTP на запущенный сервер. Число
+    SQL-запросов берется из заголовка Server-Timing, который сервер
+    добавляет при METRICS_SERVER_TIMING=1; запросы, выполненные
+    при отдаче потокового ответа, в заголовок не попадают."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.local = threading.local()
+
+    def send(self, method, url, token):
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            response = self.local.session.request(
+                method,
+                self.base_url + url,
+                headers={'Authorization': f'Token {token}'}
+            )
+        except requests.RequestException:
+            return 0, time.perf_counter() - started, None, b''
+        duration = time.perf_counter() - started
+        queries = SERVER_TIMING_QUERIES.search(
+            response.headers.get('Server-Timing', '')
+        )
+        return (
+            response.status_code,
+            duration,
+            int(queries.group(1)) if queries else None,
+            response.content
+        )
+
+    def close(self):
+        pass
+
+
+class Worker:
+    """Виртуальный клиент: отдельный пользователь и генератор случайных
+    чисел, поэтому при одинаковом --seed нагрузка повторяется.
+    Сценарий - генератор запросов (метод, адрес), которому
+    возвращается (статус, тело ответа) на предыдущий запрос."""
+
+    def __init__(self, data, user_id, token, seed):
+        self.data = data
+        self.user_id = user_id
+        self.token = token
+        self.random = Random(seed)
+        self.scenarios = list(SCENARIOS)
+        self.weights = list(SCENARIOS.values())
+        # Количество страниц списка рецептов по набору тэгов.
+        self.pages = {}
+
+    def run(self, transport, tickets, results):
+        try:
+            while next(tickets, None) is not None:
+                scenario = self.random.choices(
+                    self.scenarios, self.weights
+                )[0]
+                scenario_requests = getattr(self, scenario)()
+                response = None
+                while True:
+                    try:
+                        method, url = scenario_requests.send(response)
+                    except StopIteration:
+                        break
+                    status, duration, queries, body = transport.send(
+                        method, url, self.token
+                    )
+                    results.append((scenario, status, duration, queries))
+                    response = status, body
+        finally:
+            transport.close()
+
+    def recipe_list(self):
+        """Первый запрос с набором тэгов открывает первую страницу
+        и запоминает число страниц из поля count ответа, следующие
+        выбирают страницу в этих пределах."""
+        tags = sorted(self.random.sample(
+            self.data['tags'],
+            min(self.random.randint(0, 2), len(self.data['tags']))
+        ))
+        query = [('tags', slug) for slug in tags]
+        pages = self.pages.get(tuple(tags))
+        if pages is None:
+            status, body = yield (
+                'GET', f'/api/recipes/?{urlencode(query + [("page", 1)])}'
+            )
+            if status == 200:
+                page = json.loads(body)
+                self.pages[tuple(tags)] = max(
+                    1, -(-page['count'] // max(len(page['results']), 1))
+                )
+            return
+        query.append(('page', self.random.randint(1, pages)))
+        yield 'GET', f'/api/recipes/?{urlencode(query)}'
+
+    def recipe_detail(self):
+        recipe_id = self.random.choice(self.data['recipes'])
+        yield 'GET', f'/api/recipes/{recipe_id}/'
+
+    def ingredient_search(self):
+        name = self.random.choice(self.data['ingredients'])
+        prefix = name[:self.random.randint(1, 3)]
+        yield 'GET', f'/api/ingredients/?{urlencode({"name": prefix})}'
+
+    def toggle(self, action, model):
+        taken = self.data[model][self.user_id]
+        recipe_id = self.random.choice(self.data['recipes'])
+        if recipe_id in taken:
+            return
+        url = f'/api/recipes/{recipe_id}/{action}/'
+        yield 'POST', url
+        yield 'DELETE', url
+
+    def favorite_toggle(self):
+        return self.toggle('favorite', Favorite)
+
+    def shopping_cart_toggle(self):
+        return self.toggle('shopping_cart', ShoppingCart)
+
+    def subscriptions(self):
+        yield 'GET', '/api/users/subscriptions/?recipes_limit=3'
+
+    def shopping_list_download(self):
+        yield 'GET', '/api/recipes/download_shopping_cart/'
+
+
+class Command(BaseCommand):
+    """Нагрузочный тест API со смесью запросов реальных клиентов:
+    список рецептов с фильтром по тэгам, рецепт, поиск ингредиентов,
+    избранное и список покупок, подписки, скачивание списка покупок.
+    Запросы выполняются в текущем процессе, на сервер по --url
+    или на gunicorn, запущенный командой (--gunicorn), с той же базой
+    данных, что указана в настройках. Результат - JSON с процентилями
+    времени ответа, пропускной способностью и числом SQL-запросов
+    на запрос; его удобно сравнивать между коммитами.
+    Нужны существующие рецепты и пользователи (по одному на поток)."""
+
+    help = (
+        'Нагрузочный тест API. Выводит p50/p95/p99 времени ответа, '
+        'пропускную способность и число SQL-запросов в JSON.'
+    )
+
+    def add_arguments(self, parser):
+        target = parser.add_mutually_exclusive_group()
+        target.add_argument(
+            '--url',
+            help='Адрес запущенного сервера, например http://127.0.0.1:8000.'
+        )
+        target.add_argument(
+            '--gunicorn',
+            action='store_true',
+            help='Запустить gunicorn на время теста.'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=2,
+            help='Количество процессов gunicorn.'
+        )
+        parser.add_argument(
+            '--port',
+            type=int,
+            default=8765,
+            help='Порт gunicorn.'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=1000,
+            help='Количество сценариев в замеряемой части теста.'
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=50,
+            help='Количество сценариев для прогрева, не входят в отчет.'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='Количество одновременных клиентов.'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Начальное значение генератора случайных чисел.'
+        )
+        parser.add_argument(
+            '--output',
+            help='Файл для отчета, по умолчанию стандартный вывод.'
+        )
+
+    def handle(self, *args, **options):
+        data = self.get_data()
+        users = list(User.objects.filter(is_active=True).order_by(
+            'pk'
+        ).values_list('pk', flat=True)[:options['concurrency']])
+        if len(users) < options['concurrency']:
+            raise CommandError(
+                f'Нужно не меньше {options["concurrency"]} пользователей.'
+            )
+        workers = [
+            Worker(
+                data,
+                user_id,
+                Token.objects.get_or_create(user_id=user_id)[0].key,
+                options['seed'] + number
+            )
+            for number, user_id in enumerate(users)
+        ]
+        server = None
+        if options['gunicorn']:
+            options['url'] = f'http://127.0.0.1:{options["port"]}'
+            server = self.start_gunicorn(options)
+        try:
+            transport = (
+                HttpTransport(options['url']) if options['url']
+                else InProcessTransport()
+            )
+            self.run(workers, transport, options['warmup'])
+            started = time.perf_counter()
+            results = self.run(workers, transport, options['requests'])
+            elapsed = time.perf_counter() - started
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+        if not results:
+            raise CommandError('Не выполнено ни одного запроса.')
+        by_scenario = defaultdict(list)
+        for scenario, *result in results:
+            by_scenario[scenario].append(result)
+        report = {
+            'commit': get_commit(),
+            'target': options['url'] or 'in-process',
+            'database': connection.vendor,
+            'concurrency': options['concurrency'],
+            'duration_s': round(elapsed, 3),
+            'throughput_rps': round(len(results) / elapsed, 2),
+            **summarize([result for _, *result in results]),
+            'scenarios': {
+                scenario: summarize(by_scenario[scenario])
+                for scenario in SCENARIOS if scenario in by_scenario
+            },
+        }
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def get_data(self):
+        recipes = list(Recipe.objects.values_list('pk', flat=True))
+        if not recipes:
+            raise CommandError('В базе нет рецептов для нагрузки.')
+        data = {
+            'recipes': recipes,
+            'tags': list(Tag.objects.values_list('slug', flat=True)),
+            'ingredients': list(Ingredient.objects.order_by(
+                '?'
+            ).values_list('name', flat=True)[:1000]) or ['а'],
+        }
+        # Рецепты, уже добавленные пользователем, не трогаем:
+        # пара POST и DELETE удалила бы их.
+        for model in (Favorite, ShoppingCart):
+            data[model] = defaultdict(set)
+            for user_id, recipe_id in model.objects.values_list(
+                'user_id', 'recipe_id'
+            ).iterator():
+                data[model][user_id].add(recipe_id)
+        return data
+
+    def run(self, workers, transport, count):
+        tickets = iter(range(count))
+        results = []
+        with ThreadPoolExecutor(max_workers=len(workers)) as executor:
+            for future in [
+                executor.submit(worker.run, transport, tickets, results)
+                for worker in workers
+            ]:
+                future.result()
+        return results
+
+    def start_gunicorn(self, options):
+        server = subprocess.Popen(
+            [
+                sys.executable, '-m', 'gunicorn',
+                'foodgram.wsgi:application',
+                '--bind', f'127.0.0.1:{options["port"]}',
+                '--workers', str(options['workers']),
+            ],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, 'METRICS_SERVER_TIMING': '1'}
+        )
+        deadline = time.monotonic() + GUNICORN_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError('gunicorn завершился при запуске.')
+            try:
+                requests.get(f'{options["url"]}/api/tags/', timeout=1)
+                return server
+            except requests.RequestException:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError('gunicorn не запустился.')
@@ -0,0 +1,26 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from api.v1.response_cache import HITS_KEY, MISSES_KEY, get_stats
+
+
+class Command(BaseCommand):
+    """Выводит статистику попаданий в кеш ответов для анонимных запросов."""
+
+    help = 'Показывает долю попаданий в кеш ответов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Обнулить счетчики после вывода.'
+        )
+
+    def handle(self, *args, **options):
+        stats = get_stats()
+        self.stdout.write(
+            f'Попаданий: {stats["hits"]}, промахов: {stats["misses"]}, '
+            f'доля попаданий: {stats["hit_ratio"]:.2%}'
+        )
+        if options['reset']:
+            cache.delete_many([HITS_KEY, MISSES_KEY])
@@ -0,0 +1,287 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from ipaddress import ip_address, ip_network
+
+from django.conf import settings
+from django.db import connection
+from django.http import Http404, HttpResponse
+
+logger = logging.getLogger(__name__)
+
+REQUESTS = 'foodgram_http_requests_total'
+DURATION = 'foodgram_http_request_duration_seconds'
+QUERIES = 'foodgram_http_db_queries_total'
+QUERIES_DURATION = 'foodgram_http_db_query_duration_seconds_total'
+RESPONSE_SIZE = 'foodgram_http_response_size_bytes'
+CACHE_HITS = 'foodgram_response_cache_hits_total'
+CACHE_MISSES = 'foodgram_response_cache_misses_total'
+
+FAMILIES = (
+    (REQUESTS, 'counter', 'Количество ответов по коду статуса.'),
+    (DURATION, 'histogram', 'Время обработки запроса.'),
+    (QUERIES, 'counter', 'Количество SQL-запросов.'),
+    (QUERIES_DURATION, 'counter', 'Суммарное время SQL-запросов.'),
+    (RESPONSE_SIZE, 'summary', 'Размер тела ответа.'),
+    (CACHE_HITS, 'counter', 'Попадания в кеш ответов.'),
+    (CACHE_MISSES, 'counter', 'Промахи кеша ответов.'),
+)
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+# Процесс сбрасывает изменившиеся метрики в свой файл раз в секунду.
+FLUSH_INTERVAL = 1.0
+ALLOWED_NETWORKS = [
+    ip_network(value.strip(), strict=False)
+    for value in settings.METRICS_ALLOWED_IPS if value.strip()
+]
+
+
+class QueryRecorder:
+    """Обертка выполнения SQL, считающая запросы и их время."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+def is_running(pid):
+    """Проверяет, что процесс с указанным pid существует."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Процесс есть, но принадлежит другому пользователю.
+        pass
+    return True
+
+
+class ProcessMetrics:
+    """Метрики процесса. Значения хранятся как суммы по ключам
+    (семейство, суффикс, метки), поэтому метрики всех процессов
+    gunicorn складываются простым суммированием. Каждый процесс
+    записывает свои значения в отдельный файл каталога METRICS_DIR
+    из фонового потока раз в FLUSH_INTERVAL секунд и при выходе,
+    так что файл не отстает и у процесса без новых запросов."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.samples = defaultdict(float)
+        self.lock = threading.Lock()
+        self.changed = False
+        self.pid = None
+
+    def start(self):
+        """Запускает поток сброса в текущем процессе. Процессы
+        gunicorn создаются через fork, и поток родителя в них не
+        переходит, поэтому запуск проверяется по pid."""
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+        threading.Thread(
+            target=self.run, name='metrics-flush', daemon=True
+        ).start()
+        atexit.register(self.flush)
+
+    def run(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            if not self.changed:
+                continue
+            try:
+                self.flush()
+            except OSError:
+                logger.exception('Не удалось сохранить метрики')
+
+    def observe(self, labels, method, status, duration, queries, size):
+        if self.pid != os.getpid():
+            self.start()
+        with self.lock:
+            self.changed = True
+            samples = self.samples
+            samples[REQUESTS, '', labels + (
+                ('method', method), ('status', str(status))
+            )] += 1
+            for bound in LATENCY_BUCKETS:
+                samples[DURATION, '_bucket', labels + (
+                    ('le', str(bound)),
+                )] += duration <= bound
+            samples[DURATION, '_bucket', labels + (('le', '+Inf'),)] += 1
+            samples[DURATION, '_sum', labels] += duration
+            samples[DURATION, '_count', labels] += 1
+            samples[QUERIES, '', labels] += queries.count
+            samples[QUERIES_DURATION, '', labels] += queries.duration
+            if size is not None:
+                samples[RESPONSE_SIZE, '_sum', labels] += size
+                samples[RESPONSE_SIZE, '_count', labels] += 1
+
+    def get_path(self):
+        return os.path.join(self.directory, f'metrics_{os.getpid()}.json')
+
+    def flush(self):
+        """Атомарно перезаписывает файл метрик процесса."""
+        with self.lock:
+            self.changed = False
+            data = [
+                [family, suffix, labels, value]
+                for (family, suffix, labels), value in self.samples.items()
+            ]
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.get_path()
+        temporary = f'{path}.{threading.get_ident()}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(data, file)
+        os.replace(temporary, path)
+
+    def collect(self):
+        """Суммирует метрики из файлов всех работающих процессов.
+        Файлы завершившихся процессов удаляются: gunicorn заменяет
+        их новыми, и без удаления каталог рос бы с каждым
+        перезапуском процесса."""
+        self.flush()
+        samples = defaultdict(float)
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, name)
+            pid = name[len('metrics_'):-len('.json')]
+            if pid.isdigit() and not is_running(int(pid)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(path) as file:
+                    data = json.load(file)
+            except (OSError, ValueError):
+                continue
+            for family, suffix, labels, value in data:
+                samples[family, suffix, tuple(map(tuple, labels))] += value
+        return samples
+
+
+metrics = ProcessMetrics(settings.METRICS_DIR)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{0}="{1}"'.format(name, value.replace('\\', r'\\').replace(
+            '"', r'\"'
+        ).replace('\n', r'\n'))
+        for name, value in labels
+    ) + '}'
+
+
+def get_sort_key(item):
+    # Корзины гистограммы выводятся по возрастанию границы.
+    (family, suffix, labels), _ = item
+    return family, suffix, [
+        (name, float(value) if name == 'le' else 0.0, value)
+        for name, value in labels
+    ]
+
+
+def render(samples):
+    """Выводит метрики в текстовом формате Prometheus."""
+    by_family = defaultdict(list)
+    for (family, suffix, labels), value in sorted(
+        samples.items(), key=get_sort_key
+    ):
+        by_family[family].append(
+            f'{family}{suffix}{format_labels(labels)} {float(value)!r}'
+        )
+    lines = []
+    for family, kind, description in FAMILIES:
+        if family in by_family:
+            lines.append(f'# HELP {family} {description}')
+            lines.append(f'# TYPE {family} {kind}')
+            lines.extend(by_family[family])
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """Собирает метрики каждого запроса по маршруту и действию:
+    время ответа, количество и время SQL-запросов, размер и статус
+    ответа. Должен стоять первым в MIDDLEWARE."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryRecorder()
+        started = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+        if settings.METRICS_SERVER_TIMING:
+            # Используется командой load_test для подсчета SQL-запросов
+            # при нагрузке на отдельный сервер.
+            response['Server-Timing'] = (
+                f'db;dur={queries.duration * 1000:.3f};'
+                f'desc="{queries.count} queries", '
+                f'app;dur={duration * 1000:.3f}'
+            )
+        match = request.resolver_match
+        if match is None:
+            labels = (('view', 'unmatched'), ('action', ''))
+        else:
+            actions = getattr(match.func, 'actions', None) or {}
+            labels = (
+                ('view', match.view_name),
+                ('action', actions.get(request.method.lower(), '')),
+            )
+        metrics.observe(
+            labels,
+            request.method,
+            response.status_code,
+            duration,
+            queries,
+            None if response.streaming else len(response.content)
+        )
+        return response
+
+
+def is_allowed(request):
+    """Проверяет адрес клиента по адресам и подсетям
+    из METRICS_ALLOWED_IPS. Проверяется только REMOTE_ADDR:
+    X-Forwarded-For задает клиент, и доверять ему нельзя."""
+    try:
+        address = ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in network for network in ALLOWED_NETWORKS)
+
+
+def metrics_view(request):
+    """Отдает метрики всех процессов для Prometheus.
+    Prometheus обращается к backend:8000 напрямую, минуя nginx,
+    который отвечает 404 на этот адрес снаружи. Доступен только
+    с адресов из METRICS_ALLOWED_IPS."""
+    if not is_allowed(request):
+        raise Http404
+    from api.v1.response_cache import get_stats
+    samples = metrics.collect()
+    stats = get_stats()
+    samples[CACHE_HITS, '', ()] = stats['hits']
+    samples[CACHE_MISSES, '', ()] = stats['misses']
+    return HttpResponse(
+        render(samples),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -0,0 +1,205 @@
+import cProfile
+import logging
+import os
+import pstats
+import sys
+import time
+import traceback
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from rest_framework.exceptions import AuthenticationFailed
+
+from api import metrics
+from api.v1.authentication import CachedTokenAuthentication
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'HTTP_X_PROFILE'
+REPORT_HEADER = 'X-Profile-Report'
+LOCK_KEY = 'profiling:lock'
+# Ветви графа вызовов короче микросекунды в файл стеков не попадают.
+MIN_DURATION = 1e-6
+MAX_DEPTH = 256
+# Кадры оберток SQL из места вызова запроса исключаются.
+WRAPPERS_FILES = {
+    os.path.splitext(module.__file__)[0]
+    for module in (metrics, sys.modules[__name__])
+}
+
+
+class SqlRecorder:
+    """Обертка выполнения SQL, запоминающая каждый запрос, его время
+    и место вызова в коде проекта (метод представления, поле
+    сериализатора)."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((
+                time.perf_counter() - started,
+                sql,
+                get_origin(sys._getframe(1))
+            ))
+
+
+def get_origin(frame):
+    """Возвращает кадры стека из кода проекта от внешнего
+    к внутреннему. Строки кода читаются только при выводе."""
+    origin = []
+    while frame is not None:
+        code = frame.f_code
+        if (
+            code.co_filename.startswith(settings.BASE_DIR)
+            and 'site-packages' not in code.co_filename
+            and os.path.splitext(code.co_filename)[0] not in WRAPPERS_FILES
+        ):
+            origin.append(traceback.FrameSummary(
+                code.co_filename,
+                frame.f_lineno,
+                code.co_name,
+                lookup_line=False
+            ))
+        frame = frame.f_back
+    origin.reverse()
+    return origin
+
+
+def get_label(function):
+    filename, line, name = function
+    if filename.startswith(settings.BASE_DIR):
+        filename = os.path.relpath(filename, settings.BASE_DIR)
+    elif 'site-packages' in filename:
+        filename = filename.split('site-packages' + os.sep)[-1]
+    return f'{name} ({filename}:{line})'.replace(';', ',')
+
+
+def get_collapsed_stacks(stats):
+    """Строит стеки в свернутом формате flamegraph.pl по графу вызовов
+    cProfile. Полных стеков cProfile не хранит, поэтому время функции,
+    вызванной из разных мест, делится между ними пропорционально
+    времени на каждом ребре графа. Возвращает словарь
+    {стек через ';': время в микросекундах}."""
+    callees = defaultdict(dict)
+    for function, (_, _, _, _, callers) in stats.items():
+        for caller, (_, _, _, edge_time) in callers.items():
+            callees[caller][function] = edge_time
+    stacks = defaultdict(float)
+    pending = [
+        ((function,), 1.0)
+        for function, (_, _, _, _, callers) in stats.items()
+        if not callers
+    ]
+    while pending:
+        path, share = pending.pop()
+        function = path[-1]
+        stacks[';'.join(map(get_label, path))] += stats[function][2] * share
+        if len(path) >= MAX_DEPTH:
+            continue
+        for callee, edge_time in callees[function].items():
+            total = stats[callee][3]
+            if callee in path or not total:
+                continue
+            callee_share = share * min(edge_time / total, 1.0)
+            if total * callee_share >= MIN_DURATION:
+                pending.append((path + (callee,), callee_share))
+    return {
+        stack: round(duration * 1e6)
+        for stack, duration in stacks.items()
+        if round(duration * 1e6)
+    }
+
+
+def save_report(request, response, profiler, recorder, duration):
+    """Сохраняет отчет в отдельный каталог внутри PROFILING_DIR:
+    profile.pstats для pstats и snakeviz, profile.collapsed для
+    flamegraph.pl и speedscope, sql.txt со списком SQL-запросов.
+    Возвращает имя каталога отчета."""
+    name = '{0}-{1}-{2}'.format(
+        timezone.now().strftime('%Y%m%d-%H%M%S'),
+        os.getpid(),
+        request.path.strip('/').replace('/', '_') or 'root'
+    )
+    directory = os.path.join(settings.PROFILING_DIR, name)
+    os.makedirs(directory, exist_ok=True)
+    profiler.dump_stats(os.path.join(directory, 'profile.pstats'))
+    stacks = get_collapsed_stacks(pstats.Stats(profiler).stats)
+    with open(os.path.join(directory, 'profile.collapsed'), 'w') as file:
+        for stack, count in sorted(stacks.items()):
+            file.write(f'{stack} {count}\n')
+    with open(os.path.join(directory, 'sql.txt'), 'w') as file:
+        file.write(
+            f'{request.method} {request.get_full_path()} '
+            f'{response.status_code}\n'
+            f'Время ответа: {duration * 1000:.2f} мс\n'
+            f'SQL-запросов: {len(recorder.queries)}, '
+            f'{sum(query[0] for query in recorder.queries) * 1000:.2f} мс\n'
+        )
+        for number, (query_time, sql, origin) in enumerate(
+            recorder.queries, 1
+        ):
+            file.write(f'\n{number}. {query_time * 1000:.2f} мс\n')
+            file.writelines(traceback.format_list(origin))
+            file.write(f'{sql}\n')
+    return name
+
+
+class ProfilingMiddleware:
+    """Профилирует отдельный запрос с заголовком X-Profile: cProfile
+    и все SQL-запросы с местом вызова. Заголовок принимается от
+    сотрудников (is_staff) или со значением PROFILING_TOKEN. Профилируется
+    не больше одного запроса за PROFILING_INTERVAL секунд на все
+    процессы. Запросы без заголовка обрабатываются без накладных
+    расходов. Имя каталога с отчетом возвращается в заголовке
+    X-Profile-Report."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if HEADER not in request.META or not self.is_allowed(request):
+            return self.get_response(request)
+        if not cache.add(LOCK_KEY, True, timeout=settings.PROFILING_INTERVAL):
+            return self.get_response(request)
+        profiler = cProfile.Profile()
+        recorder = SqlRecorder()
+        started = time.perf_counter()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Профилировщик уже запущен в другом потоке процесса.
+            return self.get_response(request)
+        try:
+            with connection.execute_wrapper(recorder):
+                response = self.get_response(request)
+        finally:
+            profiler.disable()
+        duration = time.perf_counter() - started
+        try:
+            response[REPORT_HEADER] = save_report(
+                request, response, profiler, recorder, duration
+            )
+        except OSError:
+            logger.exception('Не удалось сохранить отчет профилирования')
+        return response
+
+    def is_allowed(self, request):
+        token = settings.PROFILING_TOKEN
+        if token and constant_time_compare(request.META[HEADER], token):
+            return True
+        if request.user.is_authenticated:
+            return request.user.is_staff
+        try:
+            result = CachedTokenAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return False
+        return result is not None and result[0].is_staff
@@ -0,0 +1,83 @@
+import atexit
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import override_settings
+
+from api.metrics import metrics
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import User
+
+# Метрики запросов тестов пишутся во временный каталог,
+# а не в общий METRICS_DIR.
+metrics.directory = tempfile.mkdtemp(prefix='foodgram_metrics_')
+atexit.register(shutil.rmtree, metrics.directory, ignore_errors=True)
+
+
+def create_user(name):
+    return User.objects.create_user(
+        email=f'{name}@example.com',
+        username=name,
+        first_name=name,
+        last_name=name,
+        password='Pass12345!'
+    )
+
+
+def create_tags(count):
+    return [
+        Tag.objects.create(
+            name=f'Тэг {number}',
+            color=f'#0000{number:02x}',
+            slug=f'tag-{number}'
+        )
+        for number in range(count)
+    ]
+
+
+def create_ingredients(count):
+    return [
+        Ingredient.objects.create(
+            name=f'ингредиент {number}',
+            measurement_unit='г'
+        )
+        for number in range(count)
+    ]
+
+
+def create_recipe(author, tags=(), amounts=None, name='Рецепт'):
+    """Создает рецепт. amounts - словарь {ингредиент: количество}."""
+    recipe = Recipe.objects.create(
+        author=author,
+        name=name,
+        text='Описание',
+        image='recipes/images/test.png',
+        cooking_time=10
+    )
+    recipe.tags.set(tags)
+    for ingredient, amount in (amounts or {}).items():
+        RecipeIngredient.objects.create(
+            recipe=recipe, ingredient=ingredient, amount=amount
+        )
+    return recipe
+
+
+class APITestMixin:
+    """Общая подготовка тестов API: пустой кеш, отдельный каталог
+    для файлов и отключенные фоновые задачи по рецептам
+    (уменьшенные копии картинок и похожие рецепты)."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        for name in ('schedule_renditions', 'schedule_similar'):
+            patcher = mock.patch(f'recipes.signals.{name}')
+            patcher.start()
+            self.addCleanup(patcher.stop)
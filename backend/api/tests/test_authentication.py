@@ -0,0 +1,56 @@
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+
+from api.tests.base import APITestMixin, create_user
+from api.v1.authentication import CachedTokenAuthentication, local_cache
+
+
+class CachedTokenAuthenticationTest(APITestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        local_cache.entries.clear()
+        self.user = create_user('user')
+        self.token = Token.objects.create(user=self.user)
+        self.key = self.token.key
+
+    def authenticate(self):
+        return CachedTokenAuthentication().authenticate_credentials(self.key)
+
+    def test_cached_without_queries(self):
+        self.authenticate()
+        with self.assertNumQueries(0):
+            user, token = self.authenticate()
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.email, self.user.email)
+        self.assertEqual(token.key, self.key)
+
+    def test_shared_cache(self):
+        self.authenticate()
+        local_cache.entries.clear()
+        with self.assertNumQueries(0):
+            self.authenticate()
+
+    def test_deleted_token(self):
+        self.authenticate()
+        self.token.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_inactive_user(self):
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_logout(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.key}')
+        self.assertEqual(client.get('/api/users/me/').status_code, 200)
+        self.assertEqual(
+            client.post('/api/auth/token/logout/').status_code, 204
+        )
+        self.assertEqual(client.get('/api/users/me/').status_code, 401)
@@ -0,0 +1,93 @@
+from django.test import TransactionTestCase
+from rest_framework.test import APIClient
+
+from api.tests.base import (
+    APITestMixin,
+    create_ingredients,
+    create_recipe,
+    create_user
+)
+from api.v1 import recipe_index
+from recipes.models import RecipeIngredient
+
+
+class ByIngredientsTest(APITestMixin, TransactionTestCase):
+    """Поиск по имеющимся ингредиентам. Индекс узнает об изменениях
+    после фиксации транзакции, поэтому тесты выполняются без общей
+    транзакции."""
+
+    def setUp(self):
+        super().setUp()
+        author = create_user('author')
+        self.flour, self.milk, self.eggs, self.sugar = create_ingredients(4)
+        self.pancakes = create_recipe(
+            author, amounts={self.flour: 200, self.milk: 300}, name='Блины'
+        )
+        self.pie = create_recipe(
+            author,
+            amounts={self.flour: 100, self.eggs: 2, self.sugar: 50},
+            name='Пирог'
+        )
+        self.client = APIClient()
+
+    def search(self, *ingredients):
+        response = self.client.get(
+            '/api/recipes/by_ingredients/',
+            {'ingredients': ','.join(str(item.id) for item in ingredients)}
+        )
+        self.assertEqual(response.status_code, 200)
+        return [
+            (recipe['name'], recipe['matched'], recipe['missing'])
+            for recipe in response.data['results']
+        ]
+
+    def test_order(self):
+        self.assertEqual(self.search(self.flour, self.milk), [
+            ('Блины', 2, 0),
+            ('Пирог', 1, 2),
+        ])
+        self.assertEqual(self.search(self.eggs), [('Пирог', 1, 2)])
+
+    def test_ingredient_rows_changes(self):
+        self.search(self.milk)
+        RecipeIngredient.objects.create(
+            recipe=self.pie, ingredient=self.milk, amount=100
+        )
+        self.assertEqual(self.search(self.milk), [
+            ('Блины', 1, 1),
+            ('Пирог', 1, 3),
+        ])
+        RecipeIngredient.objects.filter(
+            recipe=self.pancakes, ingredient=self.milk
+        ).delete()
+        self.assertEqual(self.search(self.milk), [('Пирог', 1, 3)])
+
+    def test_sync_does_not_change_previous_index(self):
+        self.search(self.milk)
+        index = recipe_index.get_index(recipe_index.get_version())
+        postings = dict(index.postings)
+        RecipeIngredient.objects.create(
+            recipe=self.pie, ingredient=self.milk, amount=100
+        )
+        synced = recipe_index.get_index(recipe_index.get_version())
+        self.assertIsNot(synced, index)
+        self.assertEqual(index.postings, postings)
+        self.assertEqual(len(index.match([self.milk.id], None)), 1)
+        self.assertEqual(len(synced.match([self.milk.id], None)), 2)
+
+    def test_deleted_recipe(self):
+        self.search(self.flour)
+        self.pie.delete()
+        response = self.client.get(
+            '/api/recipes/by_ingredients/', {'ingredients': self.flour.id}
+        )
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['name'], 'Блины')
+
+    def test_invalid_ingredients(self):
+        for value in ('', 'abc'):
+            with self.subTest(value=value):
+                response = self.client.get(
+                    '/api/recipes/by_ingredients/', {'ingredients': value}
+                )
+                self.assertEqual(response.status_code, 400)
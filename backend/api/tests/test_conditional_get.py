@@ -0,0 +1,85 @@
+from unittest import mock
+
+from django.db import transaction
+from django.test import TransactionTestCase
+from rest_framework.test import APIClient
+
+from api.tests.base import (
+    APITestMixin,
+    create_recipe,
+    create_tags,
+    create_user
+)
+from api.v1.versions import get_versions
+from recipes.images import generate_renditions
+
+
+class ConditionalGetTest(APITestMixin, TransactionTestCase):
+    """Метки версий обновляются после фиксации транзакции,
+    поэтому тесты выполняются без общей транзакции."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user('user')
+        self.recipe = create_recipe(create_user('author'))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assert_not_modified(self, url, response):
+        for header, value in (
+            ('HTTP_IF_NONE_MATCH', response['ETag']),
+            ('HTTP_IF_MODIFIED_SINCE', response['Last-Modified']),
+        ):
+            with self.subTest(header=header):
+                self.assertEqual(
+                    self.client.get(url, **{header: value}).status_code, 304
+                )
+
+    def test_tags(self):
+        response = self.client.get('/api/tags/')
+        self.assert_not_modified('/api/tags/', response)
+        create_tags(1)
+        changed = self.client.get(
+            '/api/tags/', HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(len(changed.data), 1)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+
+    def test_recipe(self):
+        url = f'/api/recipes/{self.recipe.id}/'
+        response = self.client.get(url)
+        self.assert_not_modified(url, response)
+        self.client.post(f'{url}favorite/')
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertTrue(changed.data['is_favorited'])
+
+    @mock.patch(
+        'recipes.images.build_renditions',
+        return_value={'small': 'cache/small.jpg'}
+    )
+    def test_recipe_renditions(self, build_renditions):
+        url = f'/api/recipes/{self.recipe.id}/'
+        response = self.client.get(url)
+        generate_renditions(self.recipe.id)
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+
+    def test_recipe_list(self):
+        response = self.client.get('/api/recipes/')
+        self.assert_not_modified('/api/recipes/', response)
+        create_recipe(self.user)
+        changed = self.client.get(
+            '/api/recipes/', HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.data['count'], 2)
+
+    def test_versions_change_after_commit(self):
+        before = get_versions('tags')
+        with transaction.atomic():
+            create_tags(1)
+            self.assertEqual(get_versions('tags'), before)
+        self.assertNotEqual(get_versions('tags'), before)
@@ -0,0 +1,83 @@
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core import serializers
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.tests.base import APITestMixin, create_recipe, create_user
+from recipes.models import Favorite, Recipe
+
+
+class CountersTest(APITestMixin, TestCase):
+    """Счетчики избранного, списков покупок, рецептов и подписчиков
+    меняются вместе со связанными записями."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user('user')
+        self.author = create_user('author')
+        self.recipe = create_recipe(self.author)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assert_counters(self, obj, **expected):
+        obj.refresh_from_db()
+        self.assertEqual(
+            {name: getattr(obj, name) for name in expected}, expected
+        )
+
+    def test_favorite(self):
+        url = f'/api/recipes/{self.recipe.id}/favorite/'
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assert_counters(self.recipe, favorites_count=1, in_carts_count=0)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assert_counters(self.recipe, favorites_count=0)
+
+    def test_shopping_cart(self):
+        url = f'/api/recipes/{self.recipe.id}/shopping_cart/'
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assert_counters(self.recipe, in_carts_count=1, favorites_count=0)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assert_counters(self.recipe, in_carts_count=0)
+
+    def test_recipes_count(self):
+        self.assert_counters(self.author, recipes_count=1)
+        create_recipe(self.author)
+        self.assert_counters(self.author, recipes_count=2)
+        self.recipe.delete()
+        self.assert_counters(self.author, recipes_count=1)
+
+    def test_followers_count(self):
+        url = f'/api/users/{self.author.id}/subscribe/'
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assert_counters(self.author, followers_count=1)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assert_counters(self.author, followers_count=0)
+
+    def test_reconcile_counters(self):
+        Recipe.objects.filter(pk=self.recipe.pk).update(favorites_count=5)
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assert_counters(self.recipe, favorites_count=0)
+
+    def test_decrement_does_not_go_below_zero(self):
+        favorite = Favorite.objects.create(user=self.user, recipe=self.recipe)
+        Recipe.objects.filter(pk=self.recipe.pk).update(favorites_count=0)
+        favorite.delete()
+        self.assert_counters(self.recipe, favorites_count=0)
+
+    @mock.patch(
+        'recipes.management.commands.generate_renditions.generate_renditions'
+    )
+    def test_loaddata_recomputes_counters(self, generate_renditions):
+        favorite = Favorite.objects.create(user=self.user, recipe=self.recipe)
+        fixture = os.path.join(tempfile.mkdtemp(), 'favorites.json')
+        with open(fixture, 'w') as file:
+            file.write(serializers.serialize('json', [favorite]))
+        favorite.delete()
+        call_command('loaddata', fixture, stdout=StringIO())
+        self.assert_counters(self.recipe, favorites_count=1)
+        generate_renditions.assert_called_once_with(self.recipe.pk)
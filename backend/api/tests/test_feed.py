@@ -0,0 +1,62 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.tests.base import APITestMixin, create_recipe, create_user
+from users.models import Subscription
+
+
+class FeedTest(APITestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user('user')
+        self.author = create_user('author')
+        self.other = create_user('other')
+        self.old = create_recipe(self.author, name='Старый')
+        create_recipe(self.other, name='Чужой')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_feed(self, url='/api/recipes/feed/'):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def get_names(self):
+        return [recipe['name'] for recipe in self.get_feed()['results']]
+
+    def test_subscription_backfills_and_fans_out(self):
+        self.assertEqual(self.get_names(), [])
+        Subscription.objects.create(user=self.user, author=self.author)
+        self.assertEqual(self.get_names(), ['Старый'])
+        create_recipe(self.author, name='Новый')
+        self.assertEqual(self.get_names(), ['Новый', 'Старый'])
+
+    def test_unsubscribe(self):
+        Subscription.objects.create(user=self.user, author=self.author)
+        Subscription.objects.filter(user=self.user).delete()
+        self.assertEqual(self.get_names(), [])
+
+    def test_deleted_recipe(self):
+        Subscription.objects.create(user=self.user, author=self.author)
+        self.old.delete()
+        self.assertEqual(self.get_names(), [])
+
+    def test_pages(self):
+        Subscription.objects.create(user=self.user, author=self.author)
+        for number in range(7):
+            create_recipe(self.author, name=f'Рецепт {number}')
+        first = self.get_feed()
+        self.assertEqual(len(first['results']), 6)
+        second = self.get_feed(first['next'])
+        self.assertEqual(
+            [recipe['name'] for recipe in second['results']],
+            ['Рецепт 0', 'Старый']
+        )
+        self.assertIsNone(second['next'])
+
+    def test_anonymous(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(
+            self.client.get('/api/recipes/feed/').status_code, 401
+        )
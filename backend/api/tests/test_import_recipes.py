@@ -0,0 +1,95 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import TestCase
+
+from api.tests.base import (
+    APITestMixin,
+    create_ingredients,
+    create_tags,
+    create_user
+)
+from recipes.models import Recipe, RecipeIngredient
+
+
+class ImportRecipesTest(APITestMixin, TestCase):
+    """Загрузка рецептов из NDJSON: ошибочные строки и уже
+    загруженные рецепты пропускаются с сообщением."""
+
+    def setUp(self):
+        super().setUp()
+        self.author = create_user('author')
+        self.tag = create_tags(1)[0]
+        self.ingredient = create_ingredients(1)[0]
+        self.path = os.path.join(tempfile.mkdtemp(), 'recipes.ndjson')
+
+    def record(self, name, amount=10, ingredient=None):
+        return {
+            'name': name,
+            'author': self.author.email,
+            'text': 'Описание',
+            'cooking_time': 5,
+            'tags': [self.tag.slug],
+            'ingredients': [{
+                'name': ingredient or self.ingredient.name,
+                'measurement_unit': self.ingredient.measurement_unit,
+                'amount': amount,
+            }],
+            'image': 'recipes/images/test.png',
+        }
+
+    def import_recipes(self, *records):
+        with open(self.path, 'w') as file:
+            for record in records:
+                file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        stderr = StringIO()
+        call_command(
+            'import_recipes', self.path, stdout=StringIO(), stderr=stderr
+        )
+        return stderr.getvalue()
+
+    def test_bad_rows_are_reported(self):
+        errors = self.import_recipes(
+            self.record('Суп'),
+            self.record('Без количества', amount=0),
+            self.record('Слишком много', amount=10 ** 6),
+            self.record('Неизвестный ингредиент', ingredient='нет такого'),
+        )
+        self.assertEqual(
+            list(Recipe.objects.values_list('name', flat=True)), ['Суп']
+        )
+        self.assertEqual(RecipeIngredient.objects.get().amount, 10)
+        for number in (2, 3, 4):
+            self.assertIn(f'Строка {number}:', errors)
+        self.assertNotIn('Строка 1:', errors)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 1)
+
+    def test_repeated_import_skips_existing(self):
+        self.import_recipes(self.record('Суп'))
+        errors = self.import_recipes(self.record('Суп'), self.record('Каша'))
+        self.assertEqual(Recipe.objects.filter(name='Суп').count(), 1)
+        self.assertTrue(Recipe.objects.filter(name='Каша').exists())
+        self.assertIn('Строка 1:', errors)
+
+    def test_database_error_keeps_other_rows(self):
+        def fan_out(recipes):
+            if any(recipe.name == 'Ошибка' for recipe in recipes):
+                raise IntegrityError('ошибка базы')
+
+        with mock.patch(
+            'recipes.management.commands.import_recipes.FeedEntry.fan_out',
+            side_effect=fan_out
+        ):
+            errors = self.import_recipes(
+                self.record('Суп'), self.record('Ошибка')
+            )
+        self.assertEqual(
+            list(Recipe.objects.values_list('name', flat=True)), ['Суп']
+        )
+        self.assertIn('Строка 2: ошибка базы', errors)
@@ -0,0 +1,34 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.test import TestCase
+
+from api.metrics import REQUESTS, metrics
+from api.tests.base import APITestMixin
+
+
+class MetricsTest(APITestMixin, TestCase):
+    """Метрики суммируются по файлам работающих процессов,
+    файлы завершившихся процессов удаляются."""
+
+    def write(self, pid, value):
+        path = os.path.join(metrics.directory, f'metrics_{pid}.json')
+        with open(path, 'w') as file:
+            json.dump([[REQUESTS, '', [['view', 'test']], value]], file)
+        return path
+
+    def test_collect_skips_finished_processes(self):
+        process = subprocess.Popen([sys.executable, '-c', ''])
+        process.wait()
+        finished = self.write(process.pid, 5)
+        running = self.write(os.getppid(), 2)
+        self.addCleanup(os.remove, running)
+        samples = metrics.collect()
+        self.assertEqual(samples[REQUESTS, '', (('view', 'test'),)], 2)
+        self.assertFalse(os.path.exists(finished))
+
+    def test_tests_use_temporary_directory(self):
+        self.assertNotEqual(metrics.directory, settings.METRICS_DIR)
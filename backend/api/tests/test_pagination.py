@@ -0,0 +1,58 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.tests.base import APITestMixin, create_recipe, create_user
+from recipes.models import Recipe
+
+
+class CursorPaginationTest(APITestMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user('author')
+        for number in range(14):
+            create_recipe(author, name=f'Рецепт {number}')
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(create_user('user'))
+
+    def test_pages_cover_all_recipes_in_order(self):
+        ids = []
+        url = '/api/recipes/?cursor='
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(ids, list(Recipe.objects.order_by(
+            '-pub_date', '-id'
+        ).values_list('id', flat=True)))
+
+    def test_count(self):
+        response = self.client.get('/api/recipes/', {'cursor': '', 'count': 1})
+        self.assertEqual(response.data['count'], 14)
+        self.assertEqual(len(response.data['results']), 6)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/recipes/', {'cursor': 'abc'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_with_ordering_is_rejected(self):
+        for params in ({'search': 'Рецепт'}, {'ordering': 'trending'}):
+            with self.subTest(params=params):
+                response = self.client.get(
+                    '/api/recipes/', {'cursor': '', **params}
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('cursor', response.data)
+                response = self.client.get('/api/recipes/', params)
+                self.assertEqual(response.status_code, 200)
+
+    def test_page_number_pagination(self):
+        response = self.client.get('/api/recipes/', {'page': 3})
+        self.assertEqual(response.data['count'], 14)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNone(response.data['next'])
@@ -0,0 +1,67 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.tests.base import (
+    APITestMixin,
+    create_ingredients,
+    create_recipe,
+    create_tags,
+    create_user
+)
+from recipes.models import Favorite, ShoppingCart
+
+# Подсчет рецептов, рецепты с авторами и флагами, ингредиенты, тэги.
+RECIPE_LIST_QUERIES = 4
+# Дата изменения рецепта для условного GET и те же три запроса
+# для самого рецепта.
+RECIPE_DETAIL_QUERIES = 4
+
+
+class RecipeListQueriesTest(APITestMixin, TestCase):
+    """Число SQL-запросов списка рецептов не зависит
+    от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('user')
+        authors = [create_user(f'author{number}') for number in range(5)]
+        tags = create_tags(3)
+        ingredients = create_ingredients(10)
+        for number in range(200):
+            recipe = create_recipe(
+                authors[number % len(authors)],
+                tags=tags[:number % 3 + 1],
+                amounts={
+                    ingredient: number + 1
+                    for ingredient in ingredients[number % 5:number % 5 + 3]
+                },
+                name=f'Рецепт {number}'
+            )
+            if number % 2:
+                Favorite.objects.create(user=cls.user, recipe=recipe)
+            if number % 3:
+                ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+
+    def test_queries_do_not_grow_with_page_size(self):
+        for user in (None, self.user):
+            self.client.force_authenticate(user)
+            for limit in (6, 50, 200):
+                with self.subTest(user=user, limit=limit):
+                    with self.assertNumQueries(RECIPE_LIST_QUERIES):
+                        response = self.client.get(
+                            '/api/recipes/', {'limit': limit}
+                        )
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(len(response.data['results']), limit)
+
+    def test_recipe_detail_queries(self):
+        self.client.force_authenticate(self.user)
+        recipe_id = self.client.get('/api/recipes/').data['results'][0]['id']
+        with self.assertNumQueries(RECIPE_DETAIL_QUERIES):
+            response = self.client.get(f'/api/recipes/{recipe_id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['ingredients']), 3)
@@ -0,0 +1,126 @@
+import base64
+from io import BytesIO
+
+from django.test import TestCase
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api.tests.base import (
+    APITestMixin,
+    create_ingredients,
+    create_tags,
+    create_user
+)
+from recipes.models import Recipe, RecipeIngredient
+
+
+def get_image():
+    buffer = BytesIO()
+    Image.new('RGB', (4, 4), 'red').save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+class RecipeWriteTest(APITestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.author = create_user('author')
+        self.tags = create_tags(3)
+        self.ingredients = create_ingredients(4)
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def get_data(self, **data):
+        return {
+            'name': 'Блины',
+            'text': 'Описание',
+            'cooking_time': 20,
+            'image': get_image(),
+            'tags': [self.tags[0].id, self.tags[1].id],
+            'ingredients': [
+                {'id': self.ingredients[0].id, 'amount': 200},
+                {'id': self.ingredients[1].id, 'amount': 300},
+            ],
+            **data
+        }
+
+    def create(self, **data):
+        response = self.client.post(
+            '/api/recipes/', self.get_data(**data), format='json'
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return Recipe.objects.get(name=response.data['name'])
+
+    def get_rows(self, recipe):
+        return {
+            row.ingredient_id: (row.pk, row.amount)
+            for row in RecipeIngredient.objects.filter(recipe=recipe)
+        }
+
+    def test_create(self):
+        recipe = self.create()
+        self.assertEqual(
+            set(recipe.tags.values_list('id', flat=True)),
+            {self.tags[0].id, self.tags[1].id}
+        )
+        self.assertEqual(
+            {pk: amount for pk, (_, amount) in self.get_rows(recipe).items()},
+            {self.ingredients[0].id: 200, self.ingredients[1].id: 300}
+        )
+
+    def test_invalid_ingredients(self):
+        first, second = self.ingredients[:2]
+        for ingredients in (
+            [],
+            [{'id': first.id, 'amount': 1}, {'id': first.id, 'amount': 2}],
+            [{'id': first.id, 'amount': 0}],
+            [{'id': second.id + 1000, 'amount': 1}],
+        ):
+            with self.subTest(ingredients=ingredients):
+                response = self.client.post(
+                    '/api/recipes/',
+                    self.get_data(ingredients=ingredients),
+                    format='json'
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('ingredients', response.data)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_update_writes_only_changed_rows(self):
+        recipe = self.create()
+        before = self.get_rows(recipe)
+        first, second, third = self.ingredients[:3]
+        response = self.client.patch(
+            f'/api/recipes/{recipe.id}/',
+            {
+                'tags': [self.tags[1].id, self.tags[2].id],
+                'ingredients': [
+                    {'id': first.id, 'amount': 200},
+                    {'id': second.id, 'amount': 350},
+                    {'id': third.id, 'amount': 5},
+                ],
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        after = self.get_rows(recipe)
+        self.assertEqual(after[first.id], before[first.id])
+        self.assertEqual(after[second.id], (before[second.id][0], 350))
+        self.assertEqual(after[third.id][1], 5)
+        self.assertEqual(
+            [tag['id'] for tag in response.data['tags']],
+            [self.tags[1].id, self.tags[2].id]
+        )
+        self.assertEqual(len(response.data['ingredients']), 3)
+
+    def test_update_removes_rows(self):
+        recipe = self.create()
+        response = self.client.patch(
+            f'/api/recipes/{recipe.id}/',
+            {'ingredients': [{'id': self.ingredients[1].id, 'amount': 300}]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(list(self.get_rows(recipe)), [self.ingredients[1].id])
@@ -0,0 +1,69 @@
+from django.test import TransactionTestCase
+from rest_framework.test import APIClient
+
+from api.tests.base import (
+    APITestMixin,
+    create_recipe,
+    create_tags,
+    create_user
+)
+
+
+class ResponseCacheTest(APITestMixin, TransactionTestCase):
+    """Кеш ответов для анонимных пользователей. Записи устаревают
+    после фиксации транзакции, поэтому тесты выполняются без
+    общей транзакции."""
+
+    def setUp(self):
+        super().setUp()
+        self.author = create_user('author')
+        self.breakfast, self.dinner = create_tags(2)
+        self.pancakes = create_recipe(
+            self.author, tags=[self.breakfast], name='Блины'
+        )
+        self.soup = create_recipe(self.author, tags=[self.dinner], name='Суп')
+        self.client = APIClient()
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_anonymous_hit(self):
+        self.assertEqual(self.get('/api/recipes/')['X-Cache'], 'MISS')
+        response = self.get('/api/recipes/')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.data['count'], 2)
+
+    def test_query_order_does_not_matter(self):
+        self.get('/api/recipes/?tags=tag-0&tags=tag-1&page=1')
+        response = self.get('/api/recipes/?page=1&tags=tag-1&tags=tag-0')
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_authenticated_not_cached(self):
+        self.client.force_authenticate(self.author)
+        self.get('/api/recipes/')
+        self.assertNotIn('X-Cache', self.get('/api/recipes/'))
+
+    def test_recipe_change_invalidates_its_entries(self):
+        url = f'/api/recipes/{self.pancakes.id}/'
+        self.get(url)
+        self.get('/api/recipes/')
+        self.get('/api/recipes/', tags='tag-1')
+        self.pancakes.name = 'Оладьи'
+        self.pancakes.save()
+        response = self.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['name'], 'Оладьи')
+        self.assertEqual(self.get('/api/recipes/')['X-Cache'], 'MISS')
+        # Список по другому тэгу не содержит измененный рецепт.
+        self.assertEqual(
+            self.get('/api/recipes/', tags='tag-1')['X-Cache'], 'HIT'
+        )
+
+    def test_new_recipe_invalidates_list(self):
+        self.get('/api/recipes/', tags='tag-0')
+        create_recipe(self.author, tags=[self.breakfast])
+        response = self.get('/api/recipes/', tags='tag-0')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['count'], 2)
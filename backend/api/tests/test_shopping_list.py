@@ -0,0 +1,98 @@
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.tests.base import (
+    APITestMixin,
+    create_ingredients,
+    create_recipe,
+    create_user
+)
+from recipes.models import ShoppingListItem
+
+
+class ShoppingListTest(APITestMixin, TestCase):
+    """Итоги списка покупок пересчитываются при изменении корзины
+    и состава рецептов."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user('user')
+        self.author = create_user('author')
+        self.flour, self.milk, self.eggs = create_ingredients(3)
+        self.pancakes = create_recipe(
+            self.author, amounts={self.flour: 200, self.milk: 300}
+        )
+        self.pie = create_recipe(
+            self.author, amounts={self.flour: 100, self.eggs: 2}
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_to_cart(self, recipe):
+        response = self.client.post(
+            f'/api/recipes/{recipe.id}/shopping_cart/'
+        )
+        self.assertEqual(response.status_code, 201)
+
+    def get_totals(self):
+        return dict(ShoppingListItem.objects.filter(
+            user=self.user
+        ).values_list('ingredient_id', 'total'))
+
+    def test_totals_follow_cart(self):
+        self.add_to_cart(self.pancakes)
+        self.add_to_cart(self.pie)
+        self.assertEqual(self.get_totals(), {
+            self.flour.id: 300, self.milk.id: 300, self.eggs.id: 2
+        })
+        self.client.delete(f'/api/recipes/{self.pancakes.id}/shopping_cart/')
+        self.assertEqual(
+            self.get_totals(), {self.flour.id: 100, self.eggs.id: 2}
+        )
+
+    def test_totals_follow_recipe_changes(self):
+        self.add_to_cart(self.pancakes)
+        self.client.force_authenticate(self.author)
+        response = self.client.patch(
+            f'/api/recipes/{self.pancakes.id}/',
+            {'ingredients': [
+                {'id': self.flour.id, 'amount': 250},
+                {'id': self.eggs.id, 'amount': 3},
+            ]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.get_totals(), {self.flour.id: 250, self.eggs.id: 3}
+        )
+
+    def test_download(self):
+        self.add_to_cart(self.pancakes)
+        self.add_to_cart(self.pie)
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/', {'format': 'json'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            json.loads(b''.join(response.streaming_content)),
+            [
+                {'name': 'ингредиент 0', 'amount': 300,
+                 'measurement_unit': 'г'},
+                {'name': 'ингредиент 1', 'amount': 300,
+                 'measurement_unit': 'г'},
+                {'name': 'ингредиент 2', 'amount': 2,
+                 'measurement_unit': 'г'},
+            ]
+        )
+
+    def test_rebuild_matches_incremental_totals(self):
+        self.add_to_cart(self.pancakes)
+        self.add_to_cart(self.pie)
+        totals = self.get_totals()
+        ShoppingListItem.objects.all().delete()
+        call_command('rebuild_shopping_lists', stdout=StringIO())
+        self.assertEqual(self.get_totals(), totals)
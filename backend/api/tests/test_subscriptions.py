@@ -0,0 +1,54 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.tests.base import APITestMixin, create_recipe, create_user
+from users.models import Subscription
+
+
+class SubscriptionsTest(APITestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user('user')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def subscribe(self, count, recipes=3):
+        for _ in range(count):
+            author = create_user(f'author{Subscription.objects.count()}')
+            for recipe_number in range(recipes):
+                create_recipe(author, name=f'Рецепт {recipe_number}')
+            Subscription.objects.create(user=self.user, author=author)
+
+    def get_subscriptions(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/users/subscriptions/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data, len(queries)
+
+    def test_recipes_limit(self):
+        self.subscribe(2)
+        data, _ = self.get_subscriptions(recipes_limit=2)
+        for author in data['results']:
+            with self.subTest(author=author['id']):
+                self.assertEqual(author['recipes_count'], 3)
+                self.assertEqual(
+                    [recipe['name'] for recipe in author['recipes']],
+                    ['Рецепт 2', 'Рецепт 1']
+                )
+                self.assertTrue(author['is_subscribed'])
+
+    def test_without_recipes_limit(self):
+        self.subscribe(1)
+        data, _ = self.get_subscriptions()
+        self.assertEqual(len(data['results'][0]['recipes']), 3)
+
+    def test_queries_do_not_grow_with_authors(self):
+        self.subscribe(1)
+        _, one_author = self.get_subscriptions(recipes_limit=2)
+        self.subscribe(5)
+        data, six_authors = self.get_subscriptions(recipes_limit=2)
+        self.assertEqual(len(data['results']), 6)
+        self.assertEqual(one_author, six_authors)
@@ -1,7 +1,10 @@
 from django.urls import include, path
 
+from .metrics import metrics_view
+
 app_name = 'api'
 
 urlpatterns = [
+    path('metrics/', metrics_view, name='metrics'),
     path('', include('api.v1.urls')),
 ]
@@ -0,0 +1,129 @@
+from collections import OrderedDict
+from hashlib import sha256
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from users.models import User
+
+KEY_PREFIX = 'auth_token:'
+# Счетчики и хеш пароля в снимок не входят: они загружаются из базы
+# при обращении, а save() снимка их не перезаписывает.
+SNAPSHOT_FIELDS = (
+    'id',
+    'email',
+    'username',
+    'first_name',
+    'last_name',
+    'is_active',
+    'is_staff',
+    'is_superuser',
+)
+# Model.from_db ждет значения в порядке полей модели.
+LOADED_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.attname in SNAPSHOT_FIELDS
+)
+
+
+class LocalCache:
+    """Ограниченный по размеру LRU-кеш процесса с временем жизни записей."""
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (monotonic() + self.timeout, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+
+local_cache = LocalCache(
+    settings.AUTH_TOKEN_CACHE_SIZE,
+    settings.AUTH_TOKEN_CACHE_LOCAL_TIMEOUT
+)
+
+
+def get_cache_key(token_key):
+    """Ключ общего кеша; сам токен в имени ключа не хранится."""
+    return KEY_PREFIX + sha256(token_key.encode()).hexdigest()
+
+
+def invalidate(*tokens_keys):
+    """Удаляет снимки пользователей для токенов из обоих кешей."""
+    for token_key in tokens_keys:
+        local_cache.delete(token_key)
+    cache.delete_many([get_cache_key(token_key) for token_key in tokens_keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену без запроса к базе на каждый вызов API.
+    Снимок пользователя ищется в LRU-кеше процесса, затем в общем кеше.
+    Снимок удаляется при удалении токена (выход), сохранении
+    пользователя (смена пароля, блокировка) и его удалении;
+    в других процессах запись LRU живет не дольше
+    AUTH_TOKEN_CACHE_LOCAL_TIMEOUT секунд."""
+
+    def authenticate_credentials(self, key):
+        snapshot = local_cache.get(key)
+        if snapshot is None:
+            snapshot = cache.get(get_cache_key(key))
+            if snapshot is not None:
+                local_cache.set(key, snapshot)
+        if snapshot is None:
+            user, token = super().authenticate_credentials(key)
+            snapshot = tuple(
+                getattr(user, field) for field in LOADED_FIELDS
+            )
+            cache.set(
+                get_cache_key(key),
+                snapshot,
+                timeout=settings.AUTH_TOKEN_CACHE_TIMEOUT
+            )
+            local_cache.set(key, snapshot)
+            return user, token
+        user = User.from_db(None, LOADED_FIELDS, snapshot)
+        return user, Token(key=key, user=user)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    invalidate(instance.key)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    if kwargs.get('raw'):
+        return
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    invalidate(*Token.objects.filter(
+        user_id=instance.pk
+    ).values_list('key', flat=True))
@@ -1,17 +1,48 @@
 import django_filters
-from django_filters.widgets import BooleanWidget
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django_filters.widgets import BooleanWidget, QueryArrayWidget
 
-from recipes.models import Recipe
+from recipes.models import Recipe, RecipeTag, Tag
+from recipes.search import search_recipes
+
+TAGS_IDS_KEY = 'tags_ids_by_slug'
+
+
+def get_tags_ids(slugs):
+    """Возвращает id тэгов по их slug из закешированного словаря."""
+    tags_ids = cache.get(TAGS_IDS_KEY)
+    if tags_ids is None:
+        tags_ids = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(TAGS_IDS_KEY, tags_ids, timeout=None)
+    return {tags_ids[slug] for slug in slugs if slug in tags_ids}
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, **kwargs):
+    if kwargs.get('raw'):
+        return
+    cache.delete(TAGS_IDS_KEY)
 
 
 class RecipeFilter(django_filters.FilterSet):
     """
-    Фильтрация рецептов по автору, тэгам, избранному и списку покупок.
+    Фильтрация рецептов по автору, тэгам, избранному, списку покупок,
+    полнотекстовый поиск и сортировка по популярности.
     """
 
-    tags = django_filters.AllValuesMultipleFilter(
-        field_name='tags__slug',
-        lookup_expr='contains',
+    ORDERING_TRENDING = 'trending'
+
+    tags = django_filters.Filter(
+        method='filter_tags',
+        widget=QueryArrayWidget,
+    )
+    search = django_filters.CharFilter(method='filter_search')
+    ordering = django_filters.ChoiceFilter(
+        choices=((ORDERING_TRENDING, 'Популярные'),),
+        method='filter_ordering'
     )
     is_favorited = django_filters.BooleanFilter(widget=BooleanWidget,)
     is_in_shopping_cart = django_filters.BooleanFilter(widget=BooleanWidget,)
@@ -21,6 +52,27 @@ class RecipeFilter(django_filters.FilterSet):
         fields = [
             'tags',
             'author',
+            'search',
+            'ordering',
             'is_favorited',
             'is_in_shopping_cart'
         ]
+
+    def filter_tags(self, queryset, name, value):
+        """Оставляет рецепты, у которых есть хотя бы один из тэгов.
+        Подзапрос к RecipeTag не размножает строки рецептов."""
+        return queryset.filter(
+            id__in=RecipeTag.objects.filter(
+                tags_id__in=get_tags_ids(value)
+            ).values('recipe_id')
+        )
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск по названию и описанию рецепта.
+        Результаты упорядочены по релевантности."""
+        return search_recipes(queryset, value)
+
+    def filter_ordering(self, queryset, name, value):
+        """Сортирует рецепты по убыванию популярности за последнее время.
+        Баллы обновляет команда update_trending."""
+        return queryset.order_by('-trending_score', '-id')
@@ -0,0 +1,89 @@
+from bisect import bisect_left
+from threading import Lock
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.renderers import JSONRenderer
+
+from api.v1 import versions
+from api.v1.serializers.ingredients import IngredientReadSerializer
+from recipes.models import Ingredient
+
+_index = None
+_lock = Lock()
+
+
+def get_version():
+    """Возвращает текущую версию справочника ингредиентов."""
+    return versions.get_versions('ingredients')['ingredients']
+
+
+def bump_version():
+    """Делает недействительными индексы ингредиентов во всех процессах."""
+    versions.bump('ingredients')
+
+
+class IngredientIndex:
+    """Неизменяемый отсортированный индекс ингредиентов.
+    Хранит заранее сериализованные JSON-записи одной строкой байтов,
+    поиск по началу названия выполняется двоичным поиском."""
+
+    def __init__(self, version, ingredients):
+        self.version = version
+        renderer = JSONRenderer()
+        entries = sorted(
+            (
+                ingredient.name.lower(),
+                ingredient.id,
+                renderer.render(IngredientReadSerializer(ingredient).data)
+            ) for ingredient in ingredients
+        )
+        self.keys = tuple(entry[0] for entry in entries)
+        self.body = b','.join(entry[2] for entry in entries)
+        offsets = []
+        position = 0
+        for entry in entries:
+            offsets.append(position)
+            position += len(entry[2]) + 1
+        offsets.append(position)
+        self.offsets = tuple(offsets)
+
+    def search(self, prefix=''):
+        """Возвращает JSON-массив ингредиентов, название которых
+        начинается с prefix (без учета регистра)."""
+        prefix = prefix.lower()
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + chr(0x10FFFF))
+        if start >= end:
+            return b'[]'
+        return b''.join((
+            b'[',
+            self.body[self.offsets[start]:self.offsets[end] - 1],
+            b']'
+        ))
+
+
+def get_index(version):
+    """Возвращает индекс процесса, перестраивая его при смене версии."""
+    global _index
+    if _index is None or _index.version != version:
+        with _lock:
+            if _index is None or _index.version != version:
+                _index = IngredientIndex(
+                    version,
+                    Ingredient.objects.only(
+                        'id', 'name', 'measurement_unit'
+                    )
+                )
+    return _index  # noqa: R504
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    if kwargs.get('raw'):
+        return
+    # Версия меняется после фиксации транзакции, чтобы индексы
+    # других процессов прочитали уже сохраненный справочник.
+    transaction.on_commit(bump_version)
@@ -1,5 +1,16 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
 from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from recipes.models import FeedEntry
 
 
 class FoodgramPagination(PageNumberPagination):
@@ -7,3 +18,135 @@ class FoodgramPagination(PageNumberPagination):
 
     page_size_query_param = 'limit'
     page_size = settings.NUMBER_OF_RECIPES
+
+
+def get_approximate_count(queryset):
+    """Возвращает оценку количества строк запроса.
+    На PostgreSQL берет оценку планировщика, иначе выполняет COUNT(*)."""
+    queryset = queryset.order_by()
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        return int(cursor.fetchone()[0][0]['Plan']['Plan Rows'])
+
+
+class RecipePagination(FoodgramPagination):
+    """Постраничная выдача рецептов.
+    С параметром cursor переключается на пагинацию по ключу
+    (pub_date, id) без COUNT(*) и OFFSET. Параметр count=1
+    добавляет в ответ приблизительное общее количество рецептов.
+    Курсор задает порядок по дате публикации, поэтому вместе
+    с поиском (search) и сортировкой (ordering) не принимается."""
+
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Неверный курсор.'
+    ordered_query_params = ('search', 'ordering')
+    ordered_cursor_message = (
+        'Курсор нельзя использовать вместе с параметрами search и '
+        'ordering, используйте page.'
+    )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        if any(
+            request.query_params.get(name)
+            for name in self.ordered_query_params
+        ):
+            raise ValidationError(
+                {self.cursor_query_param: self.ordered_cursor_message}
+            )
+        self.request = request
+        self.count = None
+        if request.query_params.get(self.count_query_param) == '1':
+            self.count = get_approximate_count(queryset)
+        queryset = queryset.order_by('-pub_date', '-id')
+        position = self.decode_cursor(
+            request.query_params[self.cursor_query_param]
+        )
+        if position is not None:
+            pub_date, pk = position
+            queryset = queryset.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=pk)
+            )
+        page_size = self.get_page_size(request)
+        results = list(queryset[:page_size + 1])
+        self.next_position = None
+        if len(results) > page_size:
+            results = results[:page_size]
+            self.next_position = (results[-1].pub_date, results[-1].id)
+        return results
+
+    def decode_cursor(self, cursor):
+        """Возвращает позицию (pub_date, id) из курсора.
+        Пустой курсор означает первую страницу."""
+        if not cursor:
+            return None
+        try:
+            pub_date, pk = urlsafe_b64decode(
+                cursor.encode('ascii')
+            ).decode('ascii').split('|')
+            pub_date = parse_datetime(pub_date)
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if pub_date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return pub_date, pk
+
+    @staticmethod
+    def encode_cursor(position):
+        pub_date, pk = position
+        return urlsafe_b64encode(
+            f'{pub_date.isoformat()}|{pk}'.encode('ascii')
+        ).decode('ascii')
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.next_position)
+        )
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        response = OrderedDict()
+        if self.count is not None:
+            response['count'] = self.count
+        response['next'] = self.get_next_link()
+        response['results'] = data
+        return Response(response)
+
+
+class FeedPagination(RecipePagination):
+    """Постраничная выдача ленты подписок, всегда по ключу
+    (pub_date, id). Порядок рецептов задает FeedEntry.timeline."""
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = True
+        self.request = request
+        self.count = None
+        page_size = self.get_page_size(request)
+        timeline = FeedEntry.timeline(
+            request.user.id,
+            page_size + 1,
+            self.decode_cursor(
+                request.query_params.get(self.cursor_query_param)
+            )
+        )
+        self.next_position = None
+        if len(timeline) > page_size:
+            timeline = timeline[:page_size]
+            self.next_position = timeline[-1]
+        recipes = queryset.in_bulk([pk for _, pk in timeline])
+        return [recipes[pk] for _, pk in timeline if pk in recipes]
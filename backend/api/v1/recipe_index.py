@@ -0,0 +1,447 @@
+from array import array
+from bisect import bisect_left, insort
+from collections import defaultdict
+from copy import copy
+from datetime import timedelta
+from threading import Lock
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from api.v1 import versions
+from recipes.models import Recipe, RecipeIngredient
+
+# Ингредиент хранится битовой маской, если встречается хотя бы
+# в каждом 64-м рецепте: тогда маска не больше двух массивов позиций.
+DENSE_RATIO = 64
+# Изменения за это время перечитываются при каждой синхронизации,
+# чтобы не потерять транзакции, завершившиеся не по порядку.
+SYNC_LOOKBACK = timedelta(minutes=1)
+# При большем числе измененных рецептов индекс строится заново.
+REBUILD_LIMIT = 1000
+# Журнал изменений в общем кеше: счетчик LOG_KEY и записи
+# LOG_KEY:<номер> со списками id рецептов. По нему индекс узнает
+# об изменениях состава без сохранения рецепта и об удалениях.
+LOG_KEY = 'recipe_index:log'
+# Индекс, не синхронизированный дольше срока жизни записей,
+# строится заново.
+LOG_TIMEOUT = timedelta(days=1)
+# Пропуск в журнале означает, что запись еще не сохранена. Если он
+# не заполняется дольше этого времени, индекс строится заново.
+GAP_TIMEOUT = timedelta(seconds=10)
+
+_index = None
+_lock = Lock()
+
+
+def get_version():
+    """Возвращает текущую версию состава рецептов."""
+    return versions.get_versions('recipe_ingredients')['recipe_ingredients']
+
+
+def bump_version():
+    """Сообщает индексам всех процессов, что состав рецептов изменился."""
+    versions.bump('recipe_ingredients')
+
+
+def get_log_position():
+    """Возвращает номер последней записи журнала изменений."""
+    return cache.get(LOG_KEY, 0)
+
+
+def log_changes(recipes_ids):
+    """Добавляет изменившиеся рецепты в журнал
+    и сообщает индексам всех процессов о новой версии."""
+    try:
+        number = cache.incr(LOG_KEY)
+    except ValueError:
+        cache.add(LOG_KEY, 0, timeout=None)
+        number = cache.incr(LOG_KEY)
+    cache.set(
+        f'{LOG_KEY}:{number}',
+        list(recipes_ids),
+        timeout=LOG_TIMEOUT.total_seconds()
+    )
+    bump_version()
+
+
+def to_mask(positions):
+    """Собирает битовую маску из отсортированных позиций."""
+    if not positions:
+        return 0
+    buffer = bytearray((positions[-1] >> 3) + 1)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+try:
+    popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+    def popcount(mask):
+        return bin(mask).count('1')
+
+
+def iter_positions(mask):
+    """Перебирает установленные биты маски от старших к младшим,
+    то есть от добавленных в индекс позже к более ранним."""
+    while mask:
+        position = mask.bit_length() - 1
+        yield position
+        mask ^= 1 << position
+
+
+def add_to_counter(slices, mask):
+    """Прибавляет единицу к счетчикам позиций из mask.
+    Счетчики хранятся поразрядно: slices[i] - маска i-х битов."""
+    for number, value in enumerate(slices):
+        slices[number] = value ^ mask
+        mask &= value
+        if not mask:
+            return
+    slices.append(mask)
+
+
+class RecipeIngredientIndex:
+    """Обратный индекс: ингредиент -> рецепты, в которых он есть.
+    Рецепту соответствует позиция - номер бита в масках. Частые
+    ингредиенты хранятся битовыми масками (int), редкие -
+    отсортированными массивами позиций. Состав рецептов хранится
+    сжато в двух массивах, измененные рецепты - в словаре.
+    Построенный индекс не изменяется: изменения применяются к копии,
+    которая затем заменяет индекс процесса, поэтому запросы
+    из других потоков всегда видят согласованное состояние."""
+
+    def __init__(self, version):
+        self.version = version
+        self.synced_at = timezone.now()
+        self.log_position = get_log_position()
+        self.gap_since = None
+        self.seen = {}
+        self.ids = array('L')
+        self.offsets = array('L', [0])
+        self.contents = array('L')
+        self.changed = {}
+        self.appended = {}
+        postings = defaultdict(lambda: array('L'))
+        for recipe_id, ingredient_id in RecipeIngredient.objects.order_by(
+            'recipe_id'
+        ).values_list('recipe_id', 'ingredient_id').iterator():
+            if not self.ids or self.ids[-1] != recipe_id:
+                if self.ids:
+                    self.offsets.append(len(self.contents))
+                self.ids.append(recipe_id)
+            postings[ingredient_id].append(len(self.ids) - 1)
+            self.contents.append(ingredient_id)
+        if self.ids:
+            self.offsets.append(len(self.contents))
+        self.built = len(self.ids)
+        self.postings = {
+            ingredient_id: (
+                to_mask(positions)
+                if len(positions) * DENSE_RATIO >= self.built
+                else positions
+            )
+            for ingredient_id, positions in postings.items()
+        }
+        by_total = defaultdict(lambda: array('L'))
+        for position in range(self.built):
+            by_total[
+                self.offsets[position + 1] - self.offsets[position]
+            ].append(position)
+        self.totals = {
+            total: to_mask(positions)
+            for total, positions in by_total.items()
+        }
+
+    def copy(self):
+        """Возвращает копию индекса для применения изменений.
+        Словари копируются, маски (int) неизменяемы, массивы позиций
+        при изменении заменяются копиями. Массив ids общий: в него
+        только добавляются рецепты в конец, а старые позиции
+        не меняются, и изменяет его только новая копия."""
+        index = copy(self)
+        index.postings = dict(self.postings)
+        index.totals = dict(self.totals)
+        index.changed = dict(self.changed)
+        index.appended = dict(self.appended)
+        return index
+
+    def position(self, recipe_id):
+        """Возвращает позицию рецепта или None."""
+        position = bisect_left(self.ids, recipe_id, 0, self.built)
+        if position < self.built and self.ids[position] == recipe_id:
+            return position
+        return self.appended.get(recipe_id)
+
+    def ingredients(self, position):
+        if position in self.changed:
+            return self.changed[position]
+        return frozenset(
+            self.contents[self.offsets[position]:self.offsets[position + 1]]
+        )
+
+    def add_posting(self, ingredient_id, position):
+        # Массивы не изменяются на месте, а заменяются копией:
+        # тот же массив используется в предыдущей версии индекса.
+        postings = self.postings.get(ingredient_id, array('L'))
+        if isinstance(postings, int):
+            self.postings[ingredient_id] = postings | 1 << position
+            return
+        postings = array('L', postings)
+        insort(postings, position)
+        self.postings[ingredient_id] = postings
+
+    def remove_posting(self, ingredient_id, position):
+        postings = self.postings.get(ingredient_id)
+        if isinstance(postings, int):
+            self.postings[ingredient_id] = postings & ~(1 << position)
+            return
+        number = bisect_left(postings, position)
+        if number < len(postings) and postings[number] == position:
+            postings = array('L', postings)
+            del postings[number]
+            self.postings[ingredient_id] = postings
+
+    def set_recipe(self, recipe_id, ingredients):
+        """Записывает новый состав рецепта. Пустой состав
+        убирает рецепт из результатов поиска."""
+        position = self.position(recipe_id)
+        if position is None:
+            if not ingredients:
+                return
+            position = len(self.ids)
+            self.ids.append(recipe_id)
+            self.appended[recipe_id] = position
+            old = frozenset()
+        else:
+            old = self.ingredients(position)
+        if old == ingredients:
+            return
+        for ingredient_id in old - ingredients:
+            self.remove_posting(ingredient_id, position)
+        for ingredient_id in ingredients - old:
+            self.add_posting(ingredient_id, position)
+        bit = 1 << position
+        if old:
+            self.totals[len(old)] &= ~bit
+        if ingredients:
+            self.totals[len(ingredients)] = (
+                self.totals.get(len(ingredients), 0) | bit
+            )
+        self.changed[position] = ingredients
+
+    def read_log(self, now):
+        """Возвращает id рецептов из новых записей журнала
+        и номер последней прочитанной записи подряд без пропусков
+        или None, если индекс выгоднее построить заново."""
+        position = get_log_position()
+        if (
+            position < self.log_position
+            or position - self.log_position > REBUILD_LIMIT
+            or now - self.synced_at > LOG_TIMEOUT
+        ):
+            return None
+        keys = [
+            f'{LOG_KEY}:{number}'
+            for number in range(self.log_position + 1, position + 1)
+        ]
+        entries = cache.get_many(keys)
+        logged = set()
+        read = self.log_position
+        for key in keys:
+            if key not in entries:
+                break
+            logged.update(entries[key])
+            read += 1
+        if read == position:
+            self.gap_since = None
+        elif self.gap_since is None:
+            self.gap_since = now
+        elif now - self.gap_since > GAP_TIMEOUT:
+            return None
+        return logged, read
+
+    def sync(self, version):
+        """Возвращает копию индекса с изменениями рецептов с прошлой
+        синхронизации: записями журнала изменений и рецептами с новым
+        updated_at (например, загруженными import_recipes).
+        Возвращает None, если индекс выгоднее построить заново."""
+        index = self.copy()
+        synced_at = timezone.now()
+        log = index.read_log(synced_at)
+        if log is None:
+            return None
+        logged, log_position = log
+        seen = dict(Recipe.objects.filter(
+            updated_at__gte=self.synced_at - SYNC_LOOKBACK
+        ).values_list('pk', 'updated_at'))
+        changed = logged.union(
+            recipe_id for recipe_id, updated_at in seen.items()
+            if self.seen.get(recipe_id) != updated_at
+        )
+        if (
+            len(changed) > REBUILD_LIMIT
+            or len(self.changed) > self.built // 10 + REBUILD_LIMIT
+        ):
+            return None
+        contents = defaultdict(set)
+        for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+            recipe_id__in=changed
+        ).values_list('recipe_id', 'ingredient_id'):
+            contents[recipe_id].add(ingredient_id)
+        for recipe_id in sorted(changed):
+            index.set_recipe(recipe_id, frozenset(contents[recipe_id]))
+        index.seen = seen
+        index.synced_at = synced_at
+        index.log_position = log_position
+        index.version = version
+        return index
+
+    def match(self, ingredients_ids, queryset):
+        return RecipeMatches(self, ingredients_ids, queryset)
+
+
+class RecipeMatches:
+    """Рецепты, в которых есть хотя бы один из ингредиентов, упорядоченные
+    по числу совпавших (по убыванию), затем недостающих (по возрастанию)
+    ингредиентов, затем от новых к старым. Число совпадений для всех
+    рецептов сразу считается поразрядными операциями над масками.
+    Поддерживает len() и срезы, поэтому подходит для Paginator;
+    срез возвращает рецепты из queryset с полями matched и missing."""
+
+    def __init__(self, index, ingredients_ids, queryset):
+        self.index = index
+        self.queryset = queryset
+        self.totals = sorted(index.totals.items())
+        self.slices = []
+        self.found = 0
+        for ingredient_id in set(ingredients_ids):
+            postings = index.postings.get(ingredient_id)
+            if postings is None:
+                continue
+            if not isinstance(postings, int):
+                postings = to_mask(postings)
+            if postings:
+                add_to_counter(self.slices, postings)
+                self.found += 1
+        self.reset()
+
+    def reset(self):
+        self.matched = 0
+        for value in self.slices:
+            self.matched |= value
+        self.count = None
+
+    def exclude(self, positions):
+        mask = ~to_mask(sorted(positions))
+        self.slices = [value & mask for value in self.slices]
+        self.reset()
+
+    def __len__(self):
+        if self.count is None:
+            self.count = popcount(self.matched)
+        return self.count
+
+    def buckets(self):
+        """Перебирает маски рецептов с одинаковыми числами
+        совпавших и недостающих ингредиентов в порядке выдачи."""
+        top = min(self.found, (1 << len(self.slices)) - 1)
+        for matched in range(top, 0, -1):
+            exact = self.matched
+            for number, value in enumerate(self.slices):
+                exact &= value if matched >> number & 1 else ~value
+            if not exact:
+                continue
+            for total, mask in self.totals:
+                if total >= matched and exact & mask:
+                    yield matched, total - matched, exact & mask
+
+    def positions(self, offset, limit):
+        found = []
+        for matched, missing, bucket in self.buckets():
+            if offset:
+                size = popcount(bucket)
+                if offset >= size:
+                    offset -= size
+                    continue
+            for position in iter_positions(bucket):
+                if offset:
+                    offset -= 1
+                    continue
+                found.append((position, matched, missing))
+                if len(found) == limit:
+                    return found
+        return found
+
+    def __getitem__(self, item):
+        start, stop, _ = item.indices(len(self))
+        while True:
+            found = self.positions(start, stop - start)
+            recipes = self.queryset.in_bulk(
+                [self.index.ids[position] for position, _, _ in found]
+            )
+            deleted = [
+                position for position, _, _ in found
+                if self.index.ids[position] not in recipes
+            ]
+            if not deleted:
+                break
+            discard([self.index.ids[position] for position in deleted])
+            self.exclude(deleted)
+        result = []
+        for position, matched, missing in found:
+            recipe = recipes[self.index.ids[position]]
+            recipe.matched = matched
+            recipe.missing = missing
+            result.append(recipe)
+        return result
+
+
+def get_index(version):
+    """Возвращает индекс процесса, синхронизируя его при смене версии."""
+    global _index
+    if _index is None or _index.version != version:
+        with _lock:
+            if _index is None:
+                _index = RecipeIngredientIndex(version)
+            elif _index.version != version:
+                _index = (
+                    _index.sync(version) or RecipeIngredientIndex(version)
+                )
+    return _index  # noqa: R504
+
+
+def discard(recipes_ids):
+    """Убирает удаленные рецепты из индекса процесса."""
+    global _index
+    with _lock:
+        if _index is None:
+            return
+        index = _index.copy()
+        for recipe_id in recipes_ids:
+            index.set_recipe(recipe_id, frozenset())
+        _index = index
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    # Журнал пополняется после фиксации транзакции, чтобы индексы
+    # других процессов прочитали уже сохраненный состав.
+    recipe_id = instance.pk
+    transaction.on_commit(lambda: log_changes([recipe_id]))
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    recipe_id = instance.recipe_id
+    transaction.on_commit(lambda: log_changes([recipe_id]))
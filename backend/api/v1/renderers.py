@@ -0,0 +1,196 @@
+import csv
+import json
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
+from queue import Queue
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework import renderers
+
+CHUNK_SIZE = 64 * 1024
+# Размер очередей пачек строк и фрагментов файла между потоком
+# запроса и потоком, формирующим PDF, и число строк в пачке.
+QUEUE_SIZE = 16
+ROWS_BATCH_SIZE = 200
+
+pdf_executor = ThreadPoolExecutor(
+    max_workers=settings.SHOPPING_LIST_PDF_WORKERS,
+    thread_name_prefix='shopping-list-pdf'
+)
+
+
+class QueueWriter:
+    """Файл для записи, передающий записанные байты в очередь
+    фрагментами не больше CHUNK_SIZE. Запись ждет, пока читатель
+    освободит место в очереди."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def write(self, data):
+        data = memoryview(data)
+        for start in range(0, len(data), CHUNK_SIZE):
+            self.chunks.put(bytes(data[start:start + CHUNK_SIZE]))
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+class Echo:
+    """Буфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListRenderer(renderers.BaseRenderer):
+    """Базовый формат выгрузки списка покупок.
+    Наследники определяют метод stream(products), который принимает
+    итератор словарей с полями ingredient__name,
+    ingredient__measurement_unit и total и возвращает итератор
+    фрагментов файла; render используется только для ответов
+    с ошибками."""
+
+    charset = 'utf-8'
+    extension = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+
+class PlainTextRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+    extension = 'txt'
+
+    def stream(self, products):
+        for product in products:
+            yield (
+                f'{product["ingredient__name"].capitalize()}: '
+                f'{product["total"]} '
+                f'{product["ingredient__measurement_unit"].lower()}\n'
+            ).encode(self.charset)
+
+
+class CSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    extension = 'csv'
+
+    def stream(self, products):
+        writer = csv.writer(Echo())
+        yield writer.writerow(
+            ('Ингредиент', 'Количество', 'Единицы измерения')
+        ).encode(self.charset)
+        for product in products:
+            yield writer.writerow((
+                product['ingredient__name'],
+                product['total'],
+                product['ingredient__measurement_unit']
+            )).encode(self.charset)
+
+
+class JSONRenderer(ShoppingListRenderer):
+    media_type = 'application/json'
+    format = 'json'
+    extension = 'json'
+
+    def stream(self, products):
+        separator = '['
+        for product in products:
+            yield (separator + json.dumps({
+                'name': product['ingredient__name'],
+                'amount': product['total'],
+                'measurement_unit': product['ingredient__measurement_unit']
+            }, ensure_ascii=False)).encode(self.charset)
+            separator = ','
+        yield b']' if separator == ',' else b'[]'
+
+
+class PDFRenderer(ShoppingListRenderer):
+    """Формирует PDF в отдельном пуле потоков.
+    Строки списка читаются из базы в потоке запроса и пачками
+    передаются в пул через ограниченную очередь, готовые фрагменты файла
+    возвращаются через вторую такую же очередь, поэтому ни список
+    строк, ни файл целиком в потоке запроса не накапливаются.
+    reportlab записывает документ при сохранении, так что первый
+    фрагмент приходит после разметки всех страниц.
+    Шрифт с поддержкой кириллицы задается SHOPPING_LIST_PDF_FONT."""
+
+    media_type = 'application/pdf'
+    format = 'pdf'
+    extension = 'pdf'
+    charset = None
+
+    def stream(self, products):
+        rows = Queue(maxsize=QUEUE_SIZE)
+        chunks = Queue(maxsize=QUEUE_SIZE)
+        future = pdf_executor.submit(
+            self.build,
+            chain.from_iterable(iter(rows.get, None)),
+            QueueWriter(chunks)
+        )
+        products = (
+            (
+                product['ingredient__name'],
+                product['total'],
+                product['ingredient__measurement_unit']
+            ) for product in products
+        )
+        finished = False
+        try:
+            try:
+                for batch in iter(
+                    lambda: list(islice(products, ROWS_BATCH_SIZE)), []
+                ):
+                    rows.put(batch)
+            finally:
+                rows.put(None)
+            for chunk in iter(chunks.get, None):
+                yield chunk
+            finished = True
+        finally:
+            if not finished:
+                # Клиент отключился или чтение строк прервалось:
+                # дочитываем очередь, чтобы освободить поток пула.
+                for _ in iter(chunks.get, None):
+                    pass
+        future.result()
+
+    @staticmethod
+    def build(rows, writer):
+        """Отрисовывает строки списка покупок и записывает документ
+        в writer. В конце всегда отправляет в очередь None."""
+        try:
+            font = 'ShoppingListFont'
+            if font not in pdfmetrics.getRegisteredFontNames():
+                pdfmetrics.registerFont(
+                    TTFont(font, settings.SHOPPING_LIST_PDF_FONT)
+                )
+            pdf = canvas.Canvas(writer, pagesize=A4)
+            top, bottom, step = A4[1] - 60, 50, 20
+            pdf.setFont(font, 16)
+            pdf.drawString(50, top, 'Список покупок')
+            y = top - 2 * step
+            for name, total, measurement_unit in rows:
+                if y < bottom:
+                    pdf.showPage()
+                    y = top
+                pdf.setFont(font, 12)
+                pdf.drawString(
+                    50, y, f'{name.capitalize()}: {total} '
+                           f'{measurement_unit.lower()}'
+                )
+                y -= step
+            pdf.save()
+        finally:
+            # При ошибке дочитываем строки, чтобы поток запроса
+            # не остался ждать места в очереди.
+            for _ in rows:
+                pass
+            writer.chunks.put(None)
@@ -0,0 +1,196 @@
+from hashlib import md5
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.response import Response
+
+from api.v1.filters import RecipeFilter, get_tags_ids
+from api.v1.versions import bump, get_versions
+from recipes.models import (
+    Recipe,
+    RecipeIngredient,
+    RecipeTag,
+    Tag
+)
+
+KEY_PREFIX = 'response:'
+HITS_KEY = 'response_cache:hits'
+MISSES_KEY = 'response_cache:misses'
+
+
+def get_cache_key(request):
+    """Ключ ответа по адресу и нормализованной строке запроса."""
+    query = urlencode(sorted(
+        (name, value)
+        for name, values in request.query_params.lists()
+        for value in values
+    ))
+    return KEY_PREFIX + md5(
+        f'{request.get_host()}{request.path}?{query}'.encode()
+    ).hexdigest()
+
+
+def count(key):
+    """Увеличивает счетчик попаданий или промахов кеша."""
+    if cache.add(key, 1, timeout=None):
+        return
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, timeout=None)
+
+
+def get_stats():
+    """Возвращает число попаданий, промахов и долю попаданий."""
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else 0.0,
+    }
+
+
+def invalidate(*names):
+    """Делает недействительными записи с указанными тэгами
+    после фиксации текущей транзакции."""
+    transaction.on_commit(lambda: bump(*names))
+
+
+class AnonymousCacheMixin:
+    """Кеширует ответы на GET-запросы анонимных пользователей.
+    Каждая запись помечается тэгами (рецепты, авторы, тэги рецептов);
+    запись устаревает, как только меняется версия любого из ее тэгов.
+    Версии тэгов хранятся так же, как метки в api.v1.versions."""
+
+    cached_actions = ('list', 'retrieve')
+
+    def get_cache_tags(self, request, data):
+        """Возвращает имена тэгов записи для данных ответа.
+        По умолчанию тэгов нет, и запись устаревает только
+        по истечении RESPONSE_CACHE_TIMEOUT."""
+        return ()
+
+    def cached(self, handler, request, *args, **kwargs):
+        if (
+            self.action not in self.cached_actions
+            or request.user.is_authenticated
+        ):
+            return handler(request, *args, **kwargs)
+        key = get_cache_key(request)
+        entry = cache.get(key)
+        if (
+            entry is not None
+            and get_versions(*entry['tags']) == entry['tags']
+        ):
+            count(HITS_KEY)
+            response = Response(entry['data'])
+            response['X-Cache'] = 'HIT'
+            return response
+        count(MISSES_KEY)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(
+                key,
+                {
+                    'data': response.data,
+                    'tags': get_versions(
+                        *self.get_cache_tags(request, response.data)
+                    ),
+                },
+                timeout=settings.RESPONSE_CACHE_TIMEOUT
+            )
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached(super().retrieve, request, *args, **kwargs)
+
+
+def get_recipe_cache_tags(request, data):
+    """Тэги записи кеша для списка или отдельного рецепта.
+    Для списка добавляются тэги состава выборки: по фильтрам
+    тэгов и автора, list:search для поиска или общий тэг list:all
+    без фильтров. Для сортировки по популярности добавляется
+    list:trending."""
+    recipes = data.get('results') if 'results' in data else [data]
+    names = {'ingredients'}
+    for recipe in recipes:
+        names.add(f'recipe:{recipe["id"]}')
+        names.add(f'user:{recipe["author"]["id"]}')
+        names.update(f'tag:{tag["id"]}' for tag in recipe['tags'])
+    if 'results' not in data:
+        return names
+    slugs = request.query_params.getlist('tags')
+    author = request.query_params.get('author')
+    if slugs:
+        names.update(
+            f'list:tag:{tag_id}' for tag_id in get_tags_ids(slugs)
+        )
+    if author:
+        names.add(f'list:author:{int(author)}')
+    if request.query_params.get('ordering') == RecipeFilter.ORDERING_TRENDING:
+        names.add('list:trending')
+    if request.query_params.get('search'):
+        names.add('list:search')
+    elif not slugs and not author:
+        names.add('list:all')
+    return names
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, created=False, **kwargs):
+    if kwargs.get('raw'):
+        return
+    names = [f'recipe:{instance.id}', 'list:search']
+    if created or kwargs['signal'] is post_delete:
+        names += ['list:all', f'list:author:{instance.author_id}']
+    invalidate(*names)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    invalidate(f'recipe:{instance.recipe_id}')
+
+
+@receiver(post_save, sender=RecipeTag)
+@receiver(post_delete, sender=RecipeTag)
+def recipe_tag_changed(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    invalidate(
+        f'recipe:{instance.recipe_id}',
+        f'list:tag:{instance.tags_id}'
+    )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_set(sender, instance, action, pk_set, **kwargs):
+    if action == 'pre_clear':
+        pk_set = set(instance.tags.values_list('id', flat=True))
+    elif action not in {'post_add', 'post_remove'}:
+        return
+    invalidate(
+        f'recipe:{instance.id}',
+        *(f'list:tag:{tag_id}' for tag_id in pk_set)
+    )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    invalidate(f'tag:{instance.id}', f'list:tag:{instance.id}')
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 
 from recipes.models import Favorite, Recipe
+from .fields import ImageRenditionsField
 
 
 class FavoriteRecipeSerializer(serializers.ModelSerializer):
@@ -8,9 +9,11 @@ class FavoriteRecipeSerializer(serializers.ModelSerializer):
     Возвращает JSON-данные, необходимые для добавления рецепта в избранное.
     """
 
+    image_renditions = ImageRenditionsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time')
         read_only_fields = ['name', 'image', 'cooking_time']
 
 
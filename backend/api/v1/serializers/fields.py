@@ -0,0 +1,173 @@
+import binascii
+import json
+import os
+import uuid
+from base64 import b64decode
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import (
+    InMemoryUploadedFile,
+    TemporaryUploadedFile
+)
+from PIL import Image
+from rest_framework import serializers
+
+from recipes.models import ImageUpload
+
+BASE64_MARKER = ';base64,'
+DECODE_CHUNK_SIZE = 64 * 1024
+
+
+class UploadedImage(File):
+    """Файл завершенной загрузки api/v1/uploads/.
+    Хранилище перемещает его в каталог картинок рецептов
+    без копирования, как временный файл обычной загрузки."""
+
+    def __init__(self, upload):
+        super().__init__(
+            upload.file.open('rb'),
+            name=os.path.basename(upload.file.name)
+        )
+        self.upload = upload
+
+    def temporary_file_path(self):
+        return self.upload.file.path
+
+
+class Base64ImageField(serializers.ImageField):
+    """Кодирует изображения в base64.
+    Вместо строки base64 принимает токен загрузки api/v1/uploads/.
+    Строка data URI декодируется по частям: небольшие картинки
+    собираются в памяти, крупные сразу пишутся во временный файл
+    (порог FILE_UPLOAD_MAX_MEMORY_SIZE, как у обычной загрузки).
+    Размер проверяется до декодирования, размеры картинки
+    в пикселях - по заголовку файла."""
+
+    default_error_messages = {
+        'invalid_base64': 'Неверная строка base64.',
+        'invalid_upload': 'Загрузка с указанным токеном не завершена '
+                          'или не существует.',
+        'too_large': (
+            'Размер картинки не должен превышать {max_size} байт.'
+        ),
+        'too_big_dimensions': (
+            'Стороны картинки не должны превышать {max_dimension} пикселей.'
+        ),
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) and data.startswith('data:image'):
+            data = self.decode(data)
+            self.check_dimensions(data)
+        elif isinstance(data, str):
+            data = self.get_upload(data)
+            self.check_dimensions(data)
+        return super().to_internal_value(data)
+
+    def get_upload(self, token):
+        """Возвращает файл завершенной загрузки текущего пользователя."""
+        try:
+            token = uuid.UUID(token)
+        except ValueError:
+            self.fail('invalid_upload')
+        upload = ImageUpload.objects.filter(
+            token=token,
+            user=self.context['request'].user.id
+        ).first()
+        if upload is None or not upload.is_complete:
+            self.fail('invalid_upload')
+        return UploadedImage(upload)
+
+    def decode(self, data):
+        """Декодирует data URI во временный файл загрузки."""
+        start = data.find(BASE64_MARKER)
+        if start == -1:
+            self.fail('invalid_base64')
+        content_type = data[len('data:'):start]
+        start += len(BASE64_MARKER)
+        encoded_size = len(data) - start
+        size = encoded_size // 4 * 3 - (
+            data.endswith('==') + data.endswith('=')
+        )
+        if encoded_size % 4 or size <= 0:
+            self.fail('invalid_base64')
+        if size > settings.RECIPE_IMAGE_MAX_SIZE:
+            self.fail('too_large', max_size=settings.RECIPE_IMAGE_MAX_SIZE)
+        name = 'temp.' + content_type.split('/')[-1]
+        if size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+            upload = TemporaryUploadedFile(name, content_type, size, None)
+        else:
+            upload = InMemoryUploadedFile(
+                BytesIO(), None, name, content_type, size, None
+            )
+        try:
+            for offset in range(start, len(data), DECODE_CHUNK_SIZE):
+                upload.write(b64decode(
+                    data[offset:offset + DECODE_CHUNK_SIZE],
+                    validate=True
+                ))
+        except binascii.Error:
+            upload.close()
+            self.fail('invalid_base64')
+        upload.seek(0)
+        return upload
+
+    def check_dimensions(self, upload):
+        """Проверяет стороны картинки по заголовку, не декодируя пиксели."""
+        max_dimension = settings.RECIPE_IMAGE_MAX_DIMENSION
+        try:
+            with Image.open(upload) as image:
+                width, height = image.size
+        except Exception:
+            # Формат проверит ImageField при дальнейшей валидации.
+            width = height = 0
+        upload.seek(0)
+        if max(width, height) > max_dimension:
+            upload.close()
+            self.fail('too_big_dimensions', max_dimension=max_dimension)
+
+
+class BulkPrimaryKeyRelatedField(serializers.ListField):
+    """Список первичных ключей, который проверяется одним запросом.
+    Возвращает объекты без повторов в порядке переданных ключей."""
+
+    child = serializers.IntegerField()
+    default_error_messages = {
+        'does_not_exist': 'Объект с id {pk_value} не существует.',
+    }
+
+    def __init__(self, queryset, **kwargs):
+        self.queryset = queryset
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        pks = list(dict.fromkeys(super().to_internal_value(data)))
+        objects = self.queryset.in_bulk(pks)
+        for pk in pks:
+            if pk not in objects:
+                self.fail('does_not_exist', pk_value=pk)
+        return [objects[pk] for pk in pks]
+
+
+class ImageRenditionsField(serializers.Field):
+    """Возвращает адреса уменьшенных копий картинки рецепта
+    и встроенную заглушку placeholder в формате data URI."""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        renditions = json.loads(value) if value else {}
+        request = self.context.get('request')
+        for name, path in renditions.items():
+            if name == 'placeholder':
+                continue
+            url = default_storage.url(path)
+            renditions[name] = (
+                request.build_absolute_uri(url) if request else url
+            )
+        return renditions
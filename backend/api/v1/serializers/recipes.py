@@ -1,30 +1,28 @@
-import base64
+from collections import Counter
+
 from django.db import transaction
-from django.core.files.base import ContentFile
 from rest_framework import serializers
 
+from api.v1.response_cache import invalidate
 from recipes.models import (
     Recipe,
     Ingredient,
     RecipeIngredient,
+    RecipeTag,
+    ShoppingListItem,
     Tag
 )
+from .fields import (
+    Base64ImageField,
+    BulkPrimaryKeyRelatedField,
+    ImageRenditionsField,
+    UploadedImage
+)
 from .tags import TagSerializer
 from .ingredients import IngredientWriteSerializer, RecipeIngredientSerializer
 from .users import UserSerializer
 
 
-class Base64ImageField(serializers.ImageField):
-    """Кодирует изображения в base64."""
-
-    def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-        return super().to_internal_value(data)
-
-
 class RecipeReadSerializer(serializers.ModelSerializer):
     """Только для чтения.
     Возвращает JSON-данные всех полей модели
@@ -32,6 +30,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     """
 
     image = Base64ImageField()
+    image_renditions = ImageRenditionsField()
     tags = TagSerializer(read_only=True, many=True)
     ingredients = IngredientWriteSerializer(many=True, source='recipes')
     author = UserSerializer(read_only=True)
@@ -49,21 +48,33 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_renditions',
             'text',
             'cooking_time'
         )
 
 
+class RecipeMatchSerializer(RecipeReadSerializer):
+    """Только для чтения.
+    Рецепт из поиска по имеющимся ингредиентам с числом совпавших
+    и недостающих ингредиентов для эндпоинта
+    api/v1/recipes/by_ingredients/.
+    """
+
+    matched = serializers.IntegerField(read_only=True)
+    missing = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeReadSerializer.Meta):
+        fields = RecipeReadSerializer.Meta.fields + ('matched', 'missing')
+
+
 class RecipeWriteSerializer(serializers.ModelSerializer):
     """Только для записи.
     Возвращает JSON-данные всех полей модели
     Recipe для эндпоинта api/v1/recipes/.
     """
 
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True
-    )
+    tags = BulkPrimaryKeyRelatedField(queryset=Tag.objects.all())
     image = Base64ImageField(
         max_length=None,
         use_url=True,
@@ -85,7 +96,8 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
 
     def validate_ingredients(self, value):
         """Предотвращает создание рецепта без ингредиентов.
-        Предотвращает дублирование ингредиентов в рецепте."""
+        Предотвращает дублирование ингредиентов в рецепте.
+        Проверяет существование всех ингредиентов одним запросом."""
         if not value:
             raise serializers.ValidationError(
                 'Создание рецепта без ингредиентов невозможно!'
@@ -95,56 +107,131 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError(
                     'Количество ингредиентов должно быть больше 0!'
                 )
-            if not Ingredient.objects.filter(id=ingredient['id']).exists():
-                raise serializers.ValidationError(
-                    'Ингредиент с указанным id не существует!'
-                )
-        return value
-
-    def validate(self, data):
-        ingredients = data['ingredients']
-        sorted_ingredients = []
+        ingredients_ids = {ingredient['id'] for ingredient in value}
+        if len(ingredients_ids) != len(value):
+            raise serializers.ValidationError(
+                'Ингредиенты не должны повторяться!'
+            )
+        ingredients = Ingredient.objects.in_bulk(ingredients_ids)
+        if len(ingredients) != len(ingredients_ids):
+            raise serializers.ValidationError(
+                'Ингредиент с указанным id не существует!'
+            )
+        return [
+            {
+                'ingredient': ingredients[ingredient['id']],
+                'amount': ingredient['amount']
+            } for ingredient in value
+        ]
+
+    def write_tags(self, recipe, tags, created):
+        """Добавляет и удаляет только изменившиеся связи рецепта с тэгами."""
+        tags_ids = {tag.id for tag in tags}
+        current_ids = set() if created else {
+            tag.id for tag in recipe.tags.all()
+        }
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tags_id=tag_id)
+            for tag_id in tags_ids - current_ids
+        )
+        RecipeTag.objects.filter(
+            recipe=recipe,
+            tags_id__in=current_ids - tags_ids
+        ).delete()
+        if tags_ids != current_ids:
+            invalidate(*(
+                f'list:tag:{tag_id}' for tag_id in tags_ids ^ current_ids
+            ))
+        self.written['tags'] = sorted(tags, key=lambda tag: tag.name)
+
+    def write_ingredients(self, recipe, ingredients, created):
+        """Создает, изменяет и удаляет только изменившиеся
+        ингредиенты рецепта и одним вызовом пересчитывает
+        списки покупок, в которых есть рецепт."""
+        items = [] if created else list(recipe.recipes.all())
+        current = {item.ingredient_id: item for item in items}
+        deltas = Counter()
+        created_items, updated_items = [], []
         for ingredient in ingredients:
-            if ingredient in sorted_ingredients:
-                raise serializers.ValidationError(
-                    'Ингредиенты не должны повторяться!'
+            ingredient_id = ingredient['ingredient'].id
+            amount = ingredient['amount']
+            deltas[ingredient_id] += amount
+            item = current.pop(ingredient_id, None)
+            if item is None:
+                created_items.append(
+                    RecipeIngredient(recipe=recipe, **ingredient)
                 )
-            sorted_ingredients.append(ingredient)
-        return data
-
-    def ingredients_creating(self, ingredients, recipe, tags):
-        """Создает набор полей для добавления ингредиентов в рецепт. """
-        recipe.tags.set(tags)
-        RecipeIngredient.objects.filter(recipe=recipe).delete()
-        RecipeIngredient.objects.bulk_create(
-            [
-                RecipeIngredient(
-                    recipe=recipe,
-                    ingredient_id=ingredient.get('id'),
-                    amount=ingredient.get('amount')
-                ) for ingredient in ingredients
-            ]
-        )
+                continue
+            deltas[ingredient_id] -= item.amount
+            if item.amount != amount:
+                item.amount = amount
+                updated_items.append(item)
+        RecipeIngredient.objects.bulk_create(created_items)
+        RecipeIngredient.objects.bulk_update(updated_items, ['amount'])
+        # Удаленные строки вычитаются из списков покупок
+        # receiver'ом post_delete.
+        RecipeIngredient.objects.filter(
+            pk__in=[item.pk for item in current.values()]
+        ).delete()
+        if not created:
+            ShoppingListItem.change_totals(recipe.id, deltas)
+        kept = [item for item in items if item.ingredient_id not in current]
+        self.written['recipes'] = kept + created_items
+
+    def write_related(self, recipe, validated_data, created):
+        """Записывает тэги и ингредиенты рецепта.
+        bulk_create и bulk_update не отправляют сигналы моделей,
+        поэтому для добавленных и измененных строк списки покупок
+        и кеш ответов обновляются здесь."""
+        self.written = {}
+        if 'tags' in validated_data:
+            self.write_tags(recipe, validated_data.pop('tags'), created)
+        if 'ingredients' in validated_data:
+            self.write_ingredients(
+                recipe,
+                validated_data.pop('ingredients'),
+                created
+            )
 
     @transaction.atomic
     def create(self, validated_data):
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredients')
+        related = {
+            name: validated_data.pop(name)
+            for name in ('tags', 'ingredients')
+        }
         recipe = super().create(validated_data)
-        recipe.tags.set(tags)
-        self.ingredients_creating(ingredients, recipe, tags)
+        self.write_related(recipe, related, created=True)
+        self.discard_upload(validated_data)
         return recipe
 
     @transaction.atomic
     def update(self, instance, validated_data):
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredients')
+        related = {
+            name: validated_data.pop(name)
+            for name in ('tags', 'ingredients') if name in validated_data
+        }
         super().update(instance, validated_data)
-        self.ingredients_creating(ingredients, instance, tags)
+        self.write_related(instance, related, created=False)
+        self.discard_upload(validated_data)
         return instance
 
+    @staticmethod
+    def discard_upload(validated_data):
+        """Удаляет использованную загрузку картинки:
+        ее файл уже перемещен в картинку рецепта."""
+        image = validated_data.get('image')
+        if isinstance(image, UploadedImage):
+            image.close()
+            image.upload.discard()
+
     def to_representation(self, instance):
-        """Отображает созданный рецепт в форме для чтения."""
+        """Отображает созданный рецепт в форме для чтения.
+        Тэги и ингредиенты берутся из только что записанных данных,
+        без повторного чтения из базы."""
+        instance._prefetched_objects_cache = {
+            **getattr(instance, '_prefetched_objects_cache', {}),
+            **getattr(self, 'written', {})
+        }
         return RecipeReadSerializer(
             instance, context={'request': self.context.get('request')}
         ).data
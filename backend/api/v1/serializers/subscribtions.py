@@ -1,3 +1,8 @@
+from collections import defaultdict
+
+from django.db import models
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
 from rest_framework import serializers
 
 from recipes.models import Recipe
@@ -5,6 +10,63 @@ from users.models import Subscription, User
 from .favorites import FavoriteRecipeSerializer
 
 
+def get_recipes_limit(request):
+    """Возвращает значение параметра recipes_limit или None."""
+    recipes_limit = request.GET.get('recipes_limit', '')
+    if recipes_limit.isdigit():
+        return int(recipes_limit)
+    return None
+
+
+def get_authors_recipes(authors_ids, recipes_limit=None):
+    """Возвращает словарь {id автора: список рецептов} одним запросом.
+    При заданном лимите оставляет для каждого автора только последние
+    recipes_limit рецептов с помощью оконной функции ROW_NUMBER."""
+    recipes = Recipe.objects.filter(author_id__in=authors_ids).only(
+        'id', 'name', 'image', 'image_renditions', 'cooking_time', 'author_id'
+    )
+    if recipes_limit is not None:
+        sql, params = recipes.annotate(
+            recipe_rank=Window(
+                expression=RowNumber(),
+                partition_by=[F('author_id')],
+                order_by=[F('pub_date').desc(), F('id').desc()]
+            )
+        ).order_by().query.sql_with_params()
+        recipes = Recipe.objects.raw(
+            f'SELECT * FROM ({sql}) ranked '
+            'WHERE ranked.recipe_rank <= %s '
+            'ORDER BY ranked.author_id, ranked.recipe_rank',
+            (*params, recipes_limit)
+        )
+    authors_recipes = defaultdict(list)
+    for recipe in recipes:
+        authors_recipes[recipe.author_id].append(recipe)
+    return authors_recipes
+
+
+class FollowListSerializer(serializers.ListSerializer):
+    """Загружает рецепты сразу для всех авторов страницы.
+    Число запросов не зависит от количества подписок на странице."""
+
+    def to_representation(self, data):
+        subscriptions = list(
+            data.all() if isinstance(data, models.Manager) else data
+        )
+        authors_ids = [
+            subscription.author_id for subscription in subscriptions
+        ]
+        if authors_ids:
+            self.context['authors_recipes'] = get_authors_recipes(
+                authors_ids,
+                get_recipes_limit(self.context['request'])
+            )
+        return [
+            self.child.to_representation(subscription)
+            for subscription in subscriptions
+        ]
+
+
 class FollowSerializer(serializers.ModelSerializer):
     """Возвращает JSON-данные всех полей модели
     Subscription для эндпоинтов api/v1/users/subscribe/
@@ -34,13 +96,15 @@ class FollowSerializer(serializers.ModelSerializer):
         'get_is_subscribed',
         read_only=True
     )
-    recipes_count = serializers.IntegerField(
+    recipes_count = serializers.SerializerMethodField(
+        'get_recipes_count',
         read_only=True
     )
     recipes = serializers.SerializerMethodField('get_recipes', read_only=True)
 
     class Meta:
         model = Subscription
+        list_serializer_class = FollowListSerializer
         fields = (
             'email',
             'id',
@@ -53,25 +117,28 @@ class FollowSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        """Проверяет наличие у текущего пользователя подписки на автора."""
-        return Subscription.objects.filter(
-            user=obj.user,
-            author=obj.author
-        ).exists()
+        """Объект подписки сам по себе означает, что подписка есть."""
+        return True
 
     def get_recipes(self, obj):
         """Возвращает все рецепты данного автора."""
-        request = self.context['request']
-        recipes_limit = request.GET.get('recipes_limit', '')
-        recipes = Recipe.objects.filter(author=obj.author)
-        if recipes_limit.isdigit():
-            recipes = recipes[:int(recipes_limit)]
+        if 'authors_recipes' in self.context:
+            recipes = self.context['authors_recipes'].get(obj.author_id, [])
+        else:
+            recipes_limit = get_recipes_limit(self.context['request'])
+            recipes = Recipe.objects.filter(author=obj.author)
+            if recipes_limit is not None:
+                recipes = recipes[:recipes_limit]
         return FavoriteRecipeSerializer(
             recipes,
             many=True,
             context=self.context
         ).data
 
+    def get_recipes_count(self, obj):
+        """Возвращает общее количество рецептов автора."""
+        return obj.author.recipes_count
+
     def validate(self, data):
         if self.context['request'].method != 'POST':
             return data
@@ -101,11 +168,6 @@ class SubscribeSerializer(FollowSerializer):
     """Возвращает JSON-данные всех полей модели
     Subscription для эндпоинтв api/v1/users/subscribe/."""
 
-    recipes_count = serializers.SerializerMethodField(
-        'get_recipes_count',
-        read_only=True
-    )
-
     class Meta:
         model = Subscription
         fields = (
@@ -118,7 +180,3 @@ class SubscribeSerializer(FollowSerializer):
             'recipes',
             'recipes_count',
         )
-
-    def get_recipes_count(self, obj):
-        """Вычисляет общее количество рецептов автора."""
-        return Recipe.objects.filter(author=obj.author).count()
@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.core.files.base import ContentFile
+from rest_framework import serializers
+
+from recipes.models import ImageUpload
+
+
+class ImageUploadSerializer(serializers.ModelSerializer):
+    """Возвращает JSON-данные загрузки картинки
+    для эндпоинта api/v1/uploads/.
+    Картинка передается целиком в поле image (multipart/form-data)
+    или объявляется полями size и content_type и затем
+    дописывается частями запросами PATCH."""
+
+    image = serializers.ImageField(write_only=True, required=False)
+    size = serializers.IntegerField(
+        min_value=1,
+        max_value=settings.RECIPE_IMAGE_MAX_SIZE,
+        required=False
+    )
+    content_type = serializers.RegexField(
+        r'^image/[\w.+-]+$',
+        max_length=100,
+        required=False
+    )
+    complete = serializers.BooleanField(
+        source='is_complete',
+        read_only=True
+    )
+
+    class Meta:
+        model = ImageUpload
+        fields = (
+            'token',
+            'image',
+            'size',
+            'content_type',
+            'offset',
+            'complete'
+        )
+        read_only_fields = ('offset',)
+
+    def validate(self, data):
+        image = data.get('image')
+        if image is None:
+            if 'size' not in data or 'content_type' not in data:
+                raise serializers.ValidationError(
+                    'Передайте картинку или ее размер и тип содержимого.'
+                )
+            return data
+        if image.size > settings.RECIPE_IMAGE_MAX_SIZE:
+            raise serializers.ValidationError(
+                'Размер картинки не должен превышать '
+                f'{settings.RECIPE_IMAGE_MAX_SIZE} байт.'
+            )
+        data['size'] = data['offset'] = image.size
+        data['content_type'] = (
+            image.content_type or 'application/octet-stream'
+        )
+        return data
+
+    def create(self, validated_data):
+        image = validated_data.pop('image', None)
+        upload = ImageUpload(**validated_data)
+        if image is None:
+            image = ContentFile(
+                b'',
+                name='upload.' + upload.content_type.split('/')[-1]
+            )
+        upload.file.save(image.name, image, save=False)
+        upload.save()
+        return upload
@@ -3,6 +3,7 @@ from django.urls import path, include
 from djoser.views import UserViewSet
 
 from .views import (
+    ImageUploadViewSet,
     IngredientViewSet,
     RecipeViewSet,
     TagViewSet,
@@ -14,6 +15,7 @@ v1_router = DefaultRouter()
 v1_router.register('recipes', RecipeViewSet, basename='recipes')
 v1_router.register('ingredients', IngredientViewSet, basename='ingredients')
 v1_router.register('tags', TagViewSet, basename='tags')
+v1_router.register('uploads', ImageUploadViewSet, basename='uploads')
 v1_router.register('users', UserSubscriptionViewSet, basename='users')
 
 urlpatterns = [
@@ -0,0 +1,158 @@
+from hashlib import md5
+from math import ceil
+from time import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from recipes.models import (
+    Favorite,
+    Recipe,
+    RecipeIngredient,
+    RecipeTag,
+    ShoppingCart,
+    Tag
+)
+from users.models import Subscription, User
+
+KEY_PREFIX = 'version:'
+
+
+def get_versions(*names):
+    """Возвращает словарь {имя: метка времени последнего изменения}.
+    Отсутствующие в кеше метки создаются со значением текущего времени."""
+    keys = [KEY_PREFIX + name for name in names]
+    stored = cache.get_many(keys)
+    for key in keys:
+        if key not in stored:
+            cache.add(key, time(), timeout=None)
+            stored[key] = cache.get(key)
+    return {name: stored[KEY_PREFIX + name] for name in names}
+
+
+def bump(*names):
+    """Отмечает изменение ресурсов с указанными именами."""
+    cache.set_many(
+        {KEY_PREFIX + name: time() for name in names},
+        timeout=None
+    )
+
+
+def bump_on_commit(*names):
+    """Отмечает изменение после фиксации текущей транзакции: иначе
+    параллельный запрос мог бы получить новую метку вместе
+    с еще не зафиксированными старыми данными."""
+    transaction.on_commit(lambda: bump(*names))
+
+
+def user_versions(user):
+    """Имена меток, от которых зависят флаги пользователя
+    is_favorited, is_in_shopping_cart и is_subscribed."""
+    if not user.is_authenticated:
+        return ()
+    return (
+        f'favorites:{user.id}',
+        f'cart:{user.id}',
+        f'subscriptions:{user.id}',
+    )
+
+
+class ConditionalGetMixin:
+    """Отвечает 304 на условные GET-запросы до выполнения основного запроса.
+    Weak ETag и Last-Modified вычисляются по меткам версий,
+    которые возвращает get_version_names."""
+
+    conditional_actions = ('list', 'retrieve')
+
+    def get_version_names(self):
+        return ()
+
+    def get_versions(self):
+        return get_versions(*self.get_version_names())
+
+    def conditional(self, handler, request, *args, **kwargs):
+        if self.action not in self.conditional_actions:
+            return handler(request, *args, **kwargs)
+        versions = self.get_versions()
+        if versions is None:
+            return handler(request, *args, **kwargs)
+        etag = 'W/"{0}"'.format(md5(repr(sorted(
+            versions.items()
+        )).encode()).hexdigest())
+        # Округление вверх: изменения в пределах одной секунды
+        # дают разные значения Last-Modified.
+        last_modified = ceil(max(versions.values(), default=0))
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=last_modified
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(post_save, sender=RecipeTag)
+@receiver(post_delete, sender=RecipeTag)
+def recipe_changed(sender, **kwargs):
+    if kwargs.get('raw'):
+        return
+    bump_on_commit('recipes')
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, **kwargs):
+    if kwargs.get('raw'):
+        return
+    bump_on_commit('tags', 'recipes')
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    if kwargs.get('raw'):
+        return
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    bump_on_commit(f'user:{instance.id}', 'recipes')
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def favorite_changed(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    bump_on_commit(f'favorites:{instance.user_id}')
+
+
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def shopping_cart_changed(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    bump_on_commit(f'cart:{instance.user_id}')
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def subscription_changed(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    bump_on_commit(f'subscriptions:{instance.user_id}')
@@ -1,17 +1,29 @@
-import io
-
-from django.db.models import Count, Exists, OuterRef, Sum
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Prefetch
 from django_filters.rest_framework import DjangoFilterBackend
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
 from djoser.serializers import SetPasswordSerializer
-from rest_framework import filters, mixins, viewsets, status
+from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
+from api.v1 import ingredient_index, recipe_index, renderers
 from api.v1.filters import RecipeFilter
+from api.v1.pagination import (
+    FeedPagination,
+    FoodgramPagination,
+    RecipePagination
+)
 from api.v1.permissions import IsAuthorOrReadOnly
+from api.v1.response_cache import AnonymousCacheMixin, get_recipe_cache_tags
+from api.v1.versions import ConditionalGetMixin, get_versions, user_versions
 from api.v1.serializers import (
     ingredients,
     favorites,
@@ -19,14 +31,17 @@ from api.v1.serializers import (
     shopping_cart,
     subscribtions,
     tags,
+    uploads,
     users
 )
 from recipes.models import (
     Ingredient,
+    ImageUpload,
     Favorite,
     Recipe,
     RecipeIngredient,
     ShoppingCart,
+    ShoppingListItem,
     Tag
 )
 from users.models import Subscription, User
@@ -39,11 +54,29 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.order_by('name')
     serializer_class = ingredients.IngredientReadSerializer
     pagination_class = None
-    filter_backends = (filters.SearchFilter,)
-    search_fields = ('^name',)
 
+    def list(self, request):
+        """Ищет ингредиенты по началу названия в индексе процесса.
+        Отвечает 304 на условный запрос, если справочник не изменился."""
+        version = ingredient_index.get_version()
+        etag = f'W/"{version}"'
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(
+                ingredient_index.get_index(version).search(
+                    request.query_params.get(api_settings.SEARCH_PARAM, '')
+                ),
+                content_type='application/json'
+            )
+        response['ETag'] = etag
+        return response
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(
+    ConditionalGetMixin,
+    AnonymousCacheMixin,
+    viewsets.ModelViewSet
+):
     """Выполняет все операции с зецептами.
     Обрабатывает все запросы для эндпоинта api/v1/recipes/."""
 
@@ -53,6 +86,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         DjangoFilterBackend,
     )
     filterset_class = RecipeFilter
+    pagination_class = RecipePagination
 
     def get_permissions(self):
         """Устанавливает разрешения."""
@@ -70,13 +104,22 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return favorites.FavoriteSerializer
         if self.action == 'shopping_cart':
             return shopping_cart.ShoppingCartSerializer
+        if self.action == 'by_ingredients':
+            return recipes.RecipeMatchSerializer
         return recipes.RecipeReadSerializer
 
     def get_queryset(self):
         """Возвращает список рецептов."""
         user_id = self.request.user.id or None
         return Recipe.objects.select_related('author').prefetch_related(
-            'recipes', 'tags', 'ingredients', 'favorites'
+            Prefetch(
+                'recipes',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+            Prefetch(
+                'tags',
+                queryset=Tag.objects.only('id', 'name', 'color', 'slug')
+            )
         ).annotate(
             is_favorited=Exists(
                 Favorite.objects.filter(
@@ -91,6 +134,40 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 )
             ))
 
+    def get_version_names(self):
+        names = ('recipes', 'ingredients', *user_versions(self.request.user))
+        if self.request.query_params.get(
+            'ordering'
+        ) == RecipeFilter.ORDERING_TRENDING:
+            names += ('list:trending',)
+        return names
+
+    def get_versions(self):
+        """Для отдельного рецепта учитывает дату его изменения
+        вместо общей метки всех рецептов."""
+        if self.action != 'retrieve':
+            return super().get_versions()
+        try:
+            recipe = Recipe.objects.filter(
+                pk=self.kwargs['pk']
+            ).values_list('updated_at', 'author_id').first()
+        except ValueError:
+            return None
+        if recipe is None:
+            return None
+        updated_at, author_id = recipe
+        recipe_versions = get_versions(
+            'tags',
+            'ingredients',
+            f'user:{author_id}',
+            *user_versions(self.request.user)
+        )
+        recipe_versions['recipe'] = updated_at.timestamp()
+        return recipe_versions
+
+    def get_cache_tags(self, request, data):
+        return get_recipe_cache_tags(request, data)
+
     def perform_create(self, serializer):
         """Сохраняет новое значение для автора."""
         serializer.save(author=self.request.user)
@@ -151,37 +228,180 @@ class RecipeViewSet(viewsets.ModelViewSet):
         api/v1/recipes/{id}/shopping cart."""
         return self.delete_method(request=request, pk=pk, model=ShoppingCart)
 
+    @action(detail=True, pagination_class=None)
+    def similar(self, request, pk):
+        """Возвращает рецепты, похожие по набору ингредиентов.
+        Обрабатывает 'GET' запросы для эндпоинта
+        api/v1/recipes/{id}/similar/."""
+        try:
+            similar = self.get_queryset().filter(
+                similar_to__recipe_id=pk
+            ).order_by(
+                '-similar_to__score'
+            )[:settings.SIMILAR_RECIPES_COUNT]
+        except ValueError:
+            raise Http404
+        if not similar and not Recipe.objects.filter(pk=pk).exists():
+            raise Http404
+        return Response(self.get_serializer(similar, many=True).data)
+
+    @staticmethod
+    def get_ingredients_ids(request):
+        """Читает id ингредиентов из параметров ingredients:
+        повторяющихся или перечисленных через запятую."""
+        try:
+            ingredients_ids = {
+                int(value)
+                for values in request.query_params.getlist('ingredients')
+                for value in values.split(',') if value.strip()
+            }
+        except ValueError:
+            raise ValidationError(
+                {'ingredients': 'Укажите id ингредиентов числами.'}
+            )
+        if not ingredients_ids:
+            raise ValidationError(
+                {'ingredients': 'Укажите хотя бы один ингредиент.'}
+            )
+        return ingredients_ids
+
+    @action(detail=False, pagination_class=FoodgramPagination)
+    def by_ingredients(self, request):
+        """Ищет рецепты, которые можно приготовить из имеющихся
+        ингредиентов. Обрабатывает 'GET' запросы для эндпоинта
+        api/v1/recipes/by_ingredients/?ingredients=1,2,3.
+        Сначала идут рецепты с большим числом совпавших ингредиентов,
+        при равенстве - с меньшим числом недостающих."""
+        matches = recipe_index.get_index(
+            recipe_index.get_version()
+        ).match(self.get_ingredients_ids(request), self.get_queryset())
+        page = self.paginate_queryset(matches)
+        return self.get_paginated_response(
+            self.get_serializer(page, many=True).data
+        )
+
     @action(
         detail=False,
-        permission_classes=(IsAuthenticated,)
+        permission_classes=(IsAuthenticated,),
+        pagination_class=FeedPagination
+    )
+    def feed(self, request):
+        """Возвращает рецепты авторов, на которых подписан пользователь,
+        от новых к старым. Обрабатывает 'GET' запросы для эндпоинта
+        api/v1/recipes/feed/. Следующая страница задается параметром
+        cursor из ссылки next."""
+        page = self.paginate_queryset(self.get_queryset())
+        return self.get_paginated_response(
+            self.get_serializer(page, many=True).data
+        )
+
+    @action(
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=(
+            renderers.PlainTextRenderer,
+            renderers.CSVRenderer,
+            renderers.JSONRenderer,
+            renderers.PDFRenderer,
+        )
     )
     def download_shopping_cart(self, request):
         """Создает список покупок для скачивания.
         Обрабатывает 'GET' запросы для эндпоинта
-        api/v1/recipes/download_shopping_cart."""
-        user = self.request.user
-        necessary_products = RecipeIngredient.objects.filter(
-            recipe__shoppingcart__user=user).values(
-                'ingredient__measurement_unit',
-                'ingredient__name').annotate(
-                    total=Sum('amount')
-        ).order_by('recipe').order_by('ingredient__name')
-        content = '\n'.join([
-            f'{ingredient["ingredient__name"].capitalize()}: '
-            f'{ingredient["total"]} '
-            f'{ingredient["ingredient__measurement_unit"].lower()}'
-            for ingredient in necessary_products
-        ])
-        shopping_cart = io.StringIO()
-        shopping_cart.write(content)
-        response = HttpResponse(content, content_type='text/plain')
+        api/v1/recipes/download_shopping_cart.
+        Формат задается параметром format: txt, csv, json или pdf."""
+        necessary_products = ShoppingListItem.objects.filter(
+            user=request.user
+        ).values(
+            'ingredient__measurement_unit',
+            'ingredient__name',
+            'total'
+        ).order_by('ingredient__name')
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(necessary_products.iterator()),
+            content_type=renderer.media_type
+        )
         response['Content-Disposition'] = (
-            'attachment; filename={0}'.format(shopping_cart)
+            f'attachment; filename="shopping_cart.{renderer.extension}"'
+        )
+        return response
+
+
+class ImageUploadViewSet(
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    viewsets.GenericViewSet
+):
+    """Принимает картинки рецептов отдельно от рецепта.
+    Обрабатывает запросы для эндпоинта api/v1/uploads/.
+    Возвращает токен, который передается в поле image рецепта."""
+
+    serializer_class = uploads.ImageUploadSerializer
+    permission_classes = (IsAuthenticated,)
+    parser_classes = (MultiPartParser, FormParser, JSONParser)
+    http_method_names = ('get', 'head', 'post', 'patch', 'options')
+    chunk_size = 64 * 1024
+
+    def get_queryset(self):
+        return ImageUpload.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        """Сохраняет загрузку для текущего пользователя."""
+        serializer.save(user=self.request.user)
+
+    def retrieve(self, request, *args, **kwargs):
+        """Возвращает состояние загрузки, в том числе число
+        принятых байт для продолжения прерванной загрузки."""
+        response = super().retrieve(request, *args, **kwargs)
+        response['Upload-Offset'] = response.data['offset']
+        return response
+
+    @transaction.atomic
+    def partial_update(self, request, pk=None):
+        """Дописывает очередную часть файла.
+        Тело запроса - байты части, заголовок Upload-Offset -
+        число уже принятых байт. При несовпадении смещения
+        отвечает 409 с текущим смещением."""
+        upload = get_object_or_404(
+            self.get_queryset().select_for_update(),
+            pk=pk
         )
+        try:
+            offset = int(request.headers['Upload-Offset'])
+        except (KeyError, ValueError):
+            raise ValidationError(
+                {'Upload-Offset': 'Передайте число уже принятых байт.'}
+            )
+        if offset != upload.offset:
+            response = Response(
+                {'offset': upload.offset},
+                status=status.HTTP_409_CONFLICT
+            )
+            response['Upload-Offset'] = upload.offset
+            return response
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+        if offset + length > upload.size:
+            raise ValidationError(
+                'Часть файла выходит за пределы объявленного размера.'
+            )
+        with open(upload.file.path, 'r+b') as file:
+            file.seek(offset)
+            while length:
+                chunk = request.stream.read(min(self.chunk_size, length))
+                if not chunk:
+                    break
+                file.write(chunk)
+                length -= len(chunk)
+                upload.offset += len(chunk)
+            file.truncate()
+        upload.save(update_fields=['offset'])
+        response = Response(self.get_serializer(upload).data)
+        response['Upload-Offset'] = upload.offset
         return response
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """Выполняет все операции с тэгами.
     Обрабатывает запросы для эндпоинта the api/v1/tags/."""
 
@@ -189,8 +409,12 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = tags.TagSerializer
     pagination_class = None
 
+    def get_version_names(self):
+        return ('tags',)
+
 
 class UserSubscriptionViewSet(
+    ConditionalGetMixin,
     mixins.CreateModelMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
@@ -201,6 +425,7 @@ class UserSubscriptionViewSet(
     api/v1/users/subscriptions."""
 
     queryset = User.objects.all()
+    conditional_actions = ('retrieve',)
 
     def get_permissions(self):
         """Устанавливает разрешения."""
@@ -222,13 +447,18 @@ class UserSubscriptionViewSet(
             return SetPasswordSerializer
         return users.UserCreateSerializer
 
+    def get_version_names(self):
+        return (
+            f'user:{self.kwargs["pk"]}',
+            f'subscriptions:{self.request.user.id}'
+        )
+
     def get_queryset(self):
         user_id = self.request.user.id or None
         if self.action in {'subscriptions', 'subscribe'}:
             return Subscription.objects.filter(
                 user=self.request.user
-            ).annotate(
-                recipes_count=Count('author__recipes'),)
+            ).select_related('author')
         return User.objects.annotate(
             is_subscribed=Exists(
                 Subscription.objects.filter(
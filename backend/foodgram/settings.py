@@ -19,6 +19,7 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',
     'django_filters',
     'djoser',
+    'sorl.thumbnail',
     'api.apps.ApiConfig',
     'recipes.apps.RecipesConfig',
     'users.apps.UsersConfig',
@@ -27,6 +28,7 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = 'users.User'
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -34,10 +36,54 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.profiling.ProfilingMiddleware',
 ]
 
 NUMBER_OF_RECIPES = 6
 
+RECIPE_IMAGE_RENDITIONS = {
+    'card': '370x240',
+    'card_2x': '740x480',
+    'detail': '480x480',
+    'detail_2x': '960x960',
+}
+
+RECIPE_IMAGE_PLACEHOLDER_SIZE = (16, 16)
+
+RECIPE_IMAGE_MAX_SIZE = int(os.getenv('RECIPE_IMAGE_MAX_SIZE', default=20 * 1024 * 1024))
+
+RECIPE_IMAGE_MAX_DIMENSION = int(os.getenv('RECIPE_IMAGE_MAX_DIMENSION', default=8000))
+
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', default=2))
+
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', default=10000))
+
+SIMILAR_RECIPES_COUNT = int(os.getenv('SIMILAR_RECIPES_COUNT', default=10))
+
+TRENDING_HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', default=72))
+
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', default=10000))
+
+AUTH_TOKEN_CACHE_LOCAL_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_LOCAL_TIMEOUT', default=10))
+
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', default=300))
+
+METRICS_DIR = os.getenv('METRICS_DIR', default='/var/tmp/foodgram_metrics')
+
+METRICS_ALLOWED_IPS = os.getenv('METRICS_ALLOWED_IPS', default='127.0.0.1').split(',')
+
+METRICS_SERVER_TIMING = os.getenv('METRICS_SERVER_TIMING', default='0') == '1'
+
+PROFILING_DIR = os.getenv('PROFILING_DIR', default='/var/tmp/foodgram_profiles')
+
+PROFILING_TOKEN = os.getenv('PROFILING_TOKEN', default='')
+
+PROFILING_INTERVAL = int(os.getenv('PROFILING_INTERVAL', default=60))
+
+SHOPPING_LIST_PDF_FONT = os.getenv('SHOPPING_LIST_PDF_FONT', default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+
+SHOPPING_LIST_PDF_WORKERS = int(os.getenv('SHOPPING_LIST_PDF_WORKERS', default=2))
+
 ROOT_URLCONF = 'foodgram.urls'
 
 TEMPLATES = [
@@ -69,6 +115,15 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='/var/tmp/foodgram_cache'),
+    }
+}
+
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', default=600))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -105,7 +160,7 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 REST_FRAMEWORK = {
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.v1.authentication.CachedTokenAuthentication',
     ],
 
     'DEFAULT_PAGINATION_CLASS': 'api.v1.pagination.FoodgramPagination',
@@ -1,5 +1,4 @@
 from django.contrib import admin
-from django.db.models import Count
 
 from .models import (
     Ingredient,
@@ -40,7 +39,8 @@ class RecipeAdmin(admin.ModelAdmin):
         'text',
         'cooking_time',
         'pub_date',
-        'favorites_count'
+        'favorites_count',
+        'in_carts_count'
     )
     search_fields = (
         'name',
@@ -57,13 +57,6 @@ class RecipeAdmin(admin.ModelAdmin):
     inlines = (RecipeIngredientInline, RecipeTagInline)
     empty_value_display = '-пусто-'
 
-    def favorites_count(self, object):
-        return object.favorites_count
-
-    def get_queryset(self, request):
-        queryset = super().get_queryset(request)
-        return queryset.annotate(favorites_count=Count('favorites'))
-
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
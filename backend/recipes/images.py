@@ -0,0 +1,88 @@
+import base64
+import io
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from PIL import Image, features
+from sorl.thumbnail import get_thumbnail
+
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+WEBP_SUPPORTED = features.check('webp')
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.RECIPE_IMAGE_WORKERS,
+    thread_name_prefix='recipe-images'
+)
+
+
+def build_placeholder(image):
+    """Возвращает крошечную копию картинки в виде data URI."""
+    with image.open('rb'), Image.open(image) as picture:
+        picture = picture.convert('RGB')
+        picture.thumbnail(settings.RECIPE_IMAGE_PLACEHOLDER_SIZE)
+        buffer = io.BytesIO()
+        picture.save(buffer, 'JPEG', quality=50)
+    return 'data:image/jpeg;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode('ascii')
+
+
+def build_renditions(image):
+    """Создает уменьшенные копии картинки рецепта.
+    Возвращает словарь {название: путь в хранилище или data URI}."""
+    renditions = {}
+    for name, geometry in settings.RECIPE_IMAGE_RENDITIONS.items():
+        renditions[name] = get_thumbnail(
+            image, geometry, crop='center', format='JPEG'
+        ).name
+        if WEBP_SUPPORTED:
+            renditions[f'{name}_webp'] = get_thumbnail(
+                image, geometry, crop='center', format='WEBP'
+            ).name
+    renditions['placeholder'] = build_placeholder(image)
+    return renditions
+
+
+def generate_renditions(recipe_id):
+    """Создает копии картинки рецепта и сохраняет их в рецепте,
+    если за время работы картинка не была заменена."""
+    try:
+        recipe = Recipe.objects.filter(pk=recipe_id).only('image').first()
+        if recipe is None or not recipe.image:
+            return
+        renditions = json.dumps(build_renditions(recipe.image))
+        with transaction.atomic():
+            recipe = Recipe.objects.select_for_update().filter(
+                pk=recipe_id,
+                image=recipe.image.name
+            ).first()
+            if recipe is not None:
+                recipe.image_renditions = renditions
+                recipe.save(
+                    update_fields=['image_renditions', 'updated_at']
+                )
+    except Exception:
+        logger.exception('Не удалось создать копии картинки рецепта %s',
+                         recipe_id)
+
+
+def generate_renditions_in_pool(recipe_id):
+    """Выполняется в потоке пула и закрывает его соединение с базой."""
+    try:
+        generate_renditions(recipe_id)
+    finally:
+        connection.close()
+
+
+def schedule_renditions(recipe_id):
+    """Ставит создание копий картинки в очередь пула
+    после фиксации текущей транзакции."""
+    transaction.on_commit(
+        lambda: executor.submit(generate_renditions_in_pool, recipe_id)
+    )
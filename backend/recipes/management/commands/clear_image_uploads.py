@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.models import ImageUpload
+
+
+class Command(BaseCommand):
+    """Удаляет загрузки картинок, которые так и не попали в рецепт."""
+
+    help = 'Удаляет устаревшие загрузки картинок вместе с файлами.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=int,
+            default=24,
+            help='Возраст загрузки в часах, после которого она удаляется.'
+        )
+
+    def handle(self, *args, **options):
+        uploads = ImageUpload.objects.filter(
+            created__lt=timezone.now() - timedelta(hours=options['hours'])
+        )
+        removed = 0
+        for upload in uploads.iterator():
+            upload.discard()
+            removed += 1
+        self.stdout.write(f'Удалено загрузок: {removed}')
@@ -0,0 +1,118 @@
+import base64
+import json
+import mimetypes
+import sys
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe, RecipeIngredient, RecipeTag
+
+
+def read_image(image):
+    """Возвращает картинку в виде data URI."""
+    content_type = mimetypes.guess_type(image.name)[0] or 'image/jpeg'
+    with image.open('rb') as file:
+        encoded = base64.b64encode(file.read()).decode('ascii')
+    return f'data:{content_type};base64,{encoded}'
+
+
+class Command(BaseCommand):
+    """Выгружает рецепты в NDJSON: одна строка - один рецепт
+    с автором (email), тэгами (slug) и ингредиентами
+    (название и единица измерения). Ссылки на другие объекты
+    не зависят от id, поэтому файл переносится между окружениями."""
+
+    help = 'Выгружает рецепты в файл NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='Файл для выгрузки, "-" - стандартный вывод.'
+        )
+        parser.add_argument(
+            '--inline-images',
+            action='store_true',
+            help='Встраивать картинки в виде data URI вместо путей.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Количество рецептов, читаемых из базы за раз.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        output = (
+            sys.stdout if path == '-'
+            else open(path, 'w', encoding='utf8')
+        )
+        started = time.monotonic()
+        try:
+            exported = self.export(output, options)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        elapsed = time.monotonic() - started
+        self.stderr.write(
+            f'Выгружено рецептов: {exported} за {elapsed:.1f} с '
+            f'({exported / max(elapsed, 0.001):.0f} в секунду)'
+        )
+
+    def export(self, output, options):
+        last_pk = 0
+        exported = 0
+        while True:
+            recipes = list(
+                Recipe.objects.filter(pk__gt=last_pk).order_by('pk')
+                .select_related('author').only(
+                    'name',
+                    'text',
+                    'cooking_time',
+                    'pub_date',
+                    'image',
+                    'author__email'
+                )[:options['chunk_size']]
+            )
+            if not recipes:
+                return exported
+            last_pk = recipes[-1].pk
+            ingredients = defaultdict(list)
+            for recipe_id, name, measurement_unit, amount in (
+                RecipeIngredient.objects.filter(
+                    recipe_id__in=[recipe.pk for recipe in recipes]
+                ).order_by('pk').values_list(
+                    'recipe_id',
+                    'ingredient__name',
+                    'ingredient__measurement_unit',
+                    'amount'
+                )
+            ):
+                ingredients[recipe_id].append({
+                    'name': name,
+                    'measurement_unit': measurement_unit,
+                    'amount': amount,
+                })
+            tags = defaultdict(list)
+            for recipe_id, slug in RecipeTag.objects.filter(
+                recipe_id__in=[recipe.pk for recipe in recipes]
+            ).values_list('recipe_id', 'tags__slug'):
+                tags[recipe_id].append(slug)
+            for recipe in recipes:
+                output.write(json.dumps({
+                    'name': recipe.name,
+                    'author': recipe.author.email,
+                    'text': recipe.text,
+                    'cooking_time': recipe.cooking_time,
+                    'pub_date': recipe.pub_date.isoformat(),
+                    'tags': tags[recipe.pk],
+                    'ingredients': ingredients[recipe.pk],
+                    'image': (
+                        read_image(recipe.image)
+                        if options['inline_images'] else recipe.image.name
+                    ),
+                }, ensure_ascii=False))
+                output.write('\n')
+            exported += len(recipes)
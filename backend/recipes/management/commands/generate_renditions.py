@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import generate_renditions
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """Создает уменьшенные копии картинок для существующих рецептов."""
+
+    help = 'Создает уменьшенные копии картинок рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать копии и для рецептов, у которых они уже есть.'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.order_by('pk')
+        if not options['all']:
+            recipes = recipes.filter(image_renditions='')
+        processed = 0
+        for recipe_id in recipes.values_list('pk', flat=True).iterator():
+            generate_renditions(recipe_id)
+            processed += 1
+        self.stdout.write(f'Обработано рецептов: {processed}')
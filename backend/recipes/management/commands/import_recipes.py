@@ -0,0 +1,298 @@
+import base64
+import json
+import multiprocessing
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, connection, models, transaction
+from django.db.backends.base.operations import BaseDatabaseOperations
+from django.utils.dateparse import parse_datetime
+
+from api.v1.versions import bump
+from recipes.models import (
+    FeedEntry,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    RecipeTag,
+    Tag
+)
+from users.models import User
+
+
+def save_image(image):
+    """Сохраняет картинку из data URI в хранилище и возвращает путь.
+    Выполняется в процессах пула."""
+    header, encoded = image.split(';base64,', 1)
+    return default_storage.save(
+        'recipes/images/import.' + header.split('/')[-1],
+        ContentFile(base64.b64decode(encoded))
+    )
+
+
+class Command(BaseCommand):
+    """Загружает рецепты из NDJSON, созданного командой export_recipes.
+    Автор, тэги и ингредиенты ищутся по словарям в памяти,
+    рецепты сохраняются порциями через bulk_create, каждая порция
+    в своей транзакции. Встроенные картинки декодируются в пуле процессов.
+    Строки с неизвестными автором, тэгами или ингредиентами
+    и с недопустимыми значениями полей пропускаются с сообщением
+    в stderr, как и рецепты, название которых у автора уже есть,
+    поэтому файл можно загружать повторно. Если порция не сохранилась
+    из-за ошибки базы, ее рецепты сохраняются по одному."""
+
+    help = (
+        'Загружает рецепты из файла NDJSON. Копии картинок затем '
+        'создаются командой generate_renditions, похожие рецепты - '
+        'командой similar_recipes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='Файл для загрузки, "-" - стандартный ввод.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество рецептов в одной транзакции.'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Количество процессов для декодирования картинок.'
+        )
+
+    def handle(self, *args, **options):
+        self.authors = dict(User.objects.values_list('email', 'id'))
+        self.tags = dict(Tag.objects.values_list('slug', 'id'))
+        self.ingredients = {
+            (name, measurement_unit): pk
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        }
+        self.existing = set(Recipe.objects.values_list('author_id', 'name'))
+        self.imported = 0
+        self.skipped = 0
+        self.duplicates = 0
+        self.line_number = 0
+        self.touched = set()
+        path = options['path']
+        lines = (
+            sys.stdin if path == '-'
+            else open(path, 'r', encoding='utf8')
+        )
+        started = time.monotonic()
+        try:
+            # Процессы пула запускаются заново, а не копируются fork,
+            # чтобы не унаследовать открытые соединения с базой.
+            with ProcessPoolExecutor(
+                options['workers'],
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup
+            ) as executor:
+                while True:
+                    batch = list(islice(lines, options['batch_size']))
+                    if not batch:
+                        break
+                    self.import_batch(batch, executor)
+        finally:
+            if lines is not sys.stdin:
+                lines.close()
+        bump(
+            'recipes',
+            'recipe_ingredients',
+            'list:all',
+            'list:search',
+            *self.touched
+        )
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'Загружено рецептов: {self.imported}, '
+            f'уже были: {self.duplicates}, '
+            f'пропущено: {self.skipped} за {elapsed:.1f} с '
+            f'({self.imported / max(elapsed, 0.001):.0f} в секунду)'
+        )
+
+    def report(self, number, reason):
+        self.stderr.write(f'Строка {number}: {reason}')
+
+    @staticmethod
+    def clean(model, field, value):
+        """Приводит значение к типу поля модели и проверяет
+        его валидаторами поля и диапазоном целых чисел."""
+        field = model._meta.get_field(field)
+        value = field.clean(value, None)
+        # SQLite не ограничивает диапазон целых чисел, поэтому
+        # границы берутся общие для всех баз данных.
+        limits = BaseDatabaseOperations.integer_field_ranges.get(
+            field.get_internal_type()
+        )
+        if limits and not limits[0] <= value <= limits[1]:
+            raise ValidationError(
+                f'{field.name}: значение {value} вне диапазона '
+                f'{limits[0]}..{limits[1]}.'
+            )
+        return value
+
+    def parse(self, line):
+        """Возвращает рецепт, дату публикации, тэги и ингредиенты
+        из строки. Если строку нельзя загрузить, вызывает ValueError
+        с причиной."""
+        try:
+            record = json.loads(line)
+            recipe = Recipe(
+                author_id=self.authors[record['author']],
+                name=self.clean(Recipe, 'name', record['name']),
+                text=record['text'],
+                cooking_time=self.clean(
+                    Recipe, 'cooking_time', record['cooking_time']
+                )
+            )
+            if not isinstance(record['image'], str):
+                raise TypeError('image')
+            recipe.image = record['image']
+            pub_date = record.get('pub_date')
+            pub_date = pub_date and parse_datetime(pub_date)
+            tags_ids = {self.tags[slug] for slug in record['tags']}
+            amounts = {}
+            for ingredient in record['ingredients']:
+                amounts.setdefault(
+                    self.ingredients[
+                        ingredient['name'],
+                        ingredient['measurement_unit']
+                    ],
+                    self.clean(
+                        RecipeIngredient, 'amount', ingredient['amount']
+                    )
+                )
+        except KeyError as error:
+            raise ValueError(f'неизвестное или пропущенное значение {error}')
+        except TypeError as error:
+            raise ValueError(f'неверный тип значения {error}')
+        except ValidationError as error:
+            raise ValueError(' '.join(error.messages))
+        return recipe, pub_date, tags_ids, amounts
+
+    def import_batch(self, lines, executor):
+        parsed = []
+        numbers = []
+        for line in lines:
+            self.line_number += 1
+            if not line.strip():
+                continue
+            try:
+                item = self.parse(line)
+            except ValueError as error:
+                self.skipped += 1
+                self.report(self.line_number, error)
+                continue
+            recipe = item[0]
+            if (recipe.author_id, recipe.name) in self.existing:
+                self.duplicates += 1
+                self.report(
+                    self.line_number,
+                    f'рецепт "{recipe.name}" у автора уже есть'
+                )
+                continue
+            self.existing.add((recipe.author_id, recipe.name))
+            parsed.append(item)
+            numbers.append(self.line_number)
+        if not parsed:
+            return
+        inline = [
+            recipe for recipe, *_ in parsed
+            if recipe.image.name.startswith('data:')
+        ]
+        for recipe, image in zip(inline, executor.map(
+            save_image,
+            [recipe.image.name for recipe in inline],
+            chunksize=max(len(inline) // 16, 1)
+        )):
+            recipe.image = image
+        try:
+            self.save(parsed)
+        except IntegrityError:
+            self.save_one_by_one(numbers, parsed)
+
+    def save_one_by_one(self, numbers, parsed):
+        """Сохраняет рецепты порции по одному, чтобы ошибка
+        в одной строке не отменяла остальные."""
+        for number, item in zip(numbers, parsed):
+            try:
+                self.save([item])
+            except IntegrityError as error:
+                self.skipped += 1
+                self.report(number, error)
+
+    def save(self, parsed):
+        """Сохраняет рецепты с тэгами и ингредиентами в одной
+        транзакции и обновляет счетчики рецептов авторов."""
+        recipes = [recipe for recipe, *_ in parsed]
+        with transaction.atomic():
+            # После неудачной попытки у рецептов могли остаться id.
+            for recipe in recipes:
+                recipe.pk = None
+            Recipe.objects.bulk_create(recipes)
+            if not connection.features.can_return_ids_from_bulk_insert:
+                # SQLite не возвращает id при массовой вставке. Запись
+                # в базу заблокирована до конца транзакции, поэтому
+                # только что вставленные рецепты - последние по id.
+                ids = Recipe.objects.order_by('-pk').values_list(
+                    'pk', flat=True
+                )[:len(recipes)]
+                for recipe, pk in zip(recipes, reversed(list(ids))):
+                    recipe.pk = pk
+            # bulk_create заполняет pub_date текущим временем
+            # (auto_now_add), поэтому дата из файла записывается отдельно.
+            dated = []
+            for recipe, pub_date, _, _ in parsed:
+                if pub_date:
+                    recipe.pub_date = pub_date
+                    dated.append(recipe)
+            Recipe.objects.bulk_update(dated, ['pub_date'])
+            FeedEntry.fan_out(recipes)
+            RecipeTag.objects.bulk_create(
+                RecipeTag(recipe=recipe, tags_id=tag_id)
+                for recipe, _, tags_ids, _ in parsed
+                for tag_id in tags_ids
+            )
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe,
+                    ingredient_id=ingredient_id,
+                    amount=amount
+                )
+                for recipe, _, _, amounts in parsed
+                for ingredient_id, amount in amounts.items()
+            )
+            authors = Counter(recipe.author_id for recipe in recipes)
+            User.objects.filter(pk__in=authors).update(
+                recipes_count=models.F('recipes_count') + models.Case(
+                    *(
+                        models.When(pk=author_id, then=count)
+                        for author_id, count in authors.items()
+                    ),
+                    default=0,
+                    output_field=models.IntegerField()
+                )
+            )
+        self.imported += len(recipes)
+        self.touched.update(
+            f'list:author:{author_id}' for author_id in authors
+        )
+        self.touched.update(
+            f'list:tag:{tag_id}'
+            for _, _, tags_ids, _ in parsed for tag_id in tags_ids
+        )
@@ -0,0 +1,226 @@
+import csv
+import io
+import json
+import os
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.v1.ingredient_index import bump_version
+from recipes.models import Ingredient
+
+FIELDS = ('name', 'measurement_unit')
+# Те же символы, что убирает str.strip() для обычного текста.
+SQL_TRIM = "E' \\t\\r\\n'"
+
+
+def read_csv(file):
+    """Построчно читает ингредиенты из CSV с заголовком."""
+    for row in csv.DictReader(file):
+        yield row['name'], row['measurement_unit']
+
+
+def read_json(file, chunk_size=64 * 1024):
+    """Потоково читает ингредиенты из массива JSON или NDJSON,
+    не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in '[],\r\n\t ':
+            position += 1
+        if position == len(buffer):
+            if eof:
+                return
+            buffer = file.read(chunk_size)
+            position = 0
+            eof = not buffer
+            continue
+        try:
+            row, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                raise
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        position = end
+        yield row['name'], row['measurement_unit']
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
+
+def normalize(name, measurement_unit):
+    return name.strip(), measurement_unit.strip()
+
+
+class Command(BaseCommand):
+    """Загружает справочник ингредиентов без повторов.
+    Ингредиент определяется парой (название, единица измерения)
+    без учета пробелов по краям: новые пары добавляются,
+    сохраненные с лишними пробелами исправляются,
+    остальные пропускаются. Повторный запуск ничего не меняет.
+    На PostgreSQL данные загружаются через COPY во временную
+    таблицу и объединяются со справочником двумя запросами."""
+
+    help = 'Загружает ингредиенты из CSV или JSON без дублирования.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=os.path.join(settings.BASE_DIR, 'data/ingredients.csv'),
+            help='Файл с ингредиентами (по умолчанию data/ingredients.csv).'
+        )
+        parser.add_argument(
+            '--format',
+            choices=READERS,
+            help='Формат файла; по умолчанию определяется по расширению.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество строк, обрабатываемых за раз.'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Показать изменения, не сохраняя их.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or os.path.splitext(
+            path
+        )[1].lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        self.dry_run = options['dry_run']
+        self.verbosity = options['verbosity']
+        with open(path, 'r', encoding='utf8') as file:
+            rows = (
+                normalize(*row) for row in READERS[file_format](file)
+            )
+            with transaction.atomic():
+                if connection.vendor == 'postgresql':
+                    total, inserted, updated = self.merge_with_copy(
+                        rows, options['batch_size']
+                    )
+                else:
+                    total, inserted, updated = self.merge(
+                        rows, options['batch_size']
+                    )
+                transaction.set_rollback(self.dry_run)
+        if (inserted or updated) and not self.dry_run:
+            bump_version()
+        self.stdout.write(
+            ('Будет ' if self.dry_run else '')
+            + f'добавлено: {inserted}, исправлено: {updated}, '
+            f'пропущено: {total - inserted - updated}'
+        )
+
+    def show(self, action, name, measurement_unit):
+        """Выводит изменение при пробном запуске или подробном выводе."""
+        if self.dry_run or self.verbosity > 1:
+            self.stdout.write(f'{action} {name}, {measurement_unit}')
+
+    def merge(self, rows, batch_size):
+        """Объединяет строки со справочником средствами ORM."""
+        existing = {}
+        for ingredient in Ingredient.objects.order_by('pk'):
+            key = normalize(ingredient.name, ingredient.measurement_unit)
+            # Из уже повторяющихся записей берется записанная без пробелов.
+            if key not in existing or (
+                ingredient.name, ingredient.measurement_unit
+            ) == key:
+                existing[key] = ingredient
+        total = inserted = updated = 0
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return total, inserted, updated
+            total += len(batch)
+            created, changed = [], []
+            for key in dict.fromkeys(batch):
+                ingredient = existing.get(key)
+                if ingredient is None:
+                    existing[key] = ingredient = Ingredient(
+                        name=key[0],
+                        measurement_unit=key[1]
+                    )
+                    created.append(ingredient)
+                    self.show('+', *key)
+                elif (ingredient.name, ingredient.measurement_unit) != key:
+                    ingredient.name, ingredient.measurement_unit = key
+                    changed.append(ingredient)
+                    self.show('~', *key)
+            Ingredient.objects.bulk_create(created)
+            Ingredient.objects.bulk_update(changed, FIELDS)
+            inserted += len(created)
+            updated += len(changed)
+
+    def merge_with_copy(self, rows, batch_size):
+        """Объединяет строки со справочником через COPY
+        во временную таблицу (PostgreSQL)."""
+        table = Ingredient._meta.db_table
+        total = 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredient_load '
+                '(name varchar(200), measurement_unit varchar(200)) '
+                'ON COMMIT DROP'
+            )
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                total += len(batch)
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(batch)
+                buffer.seek(0)
+                cursor.copy_expert(
+                    'COPY ingredient_load (name, measurement_unit) '
+                    'FROM STDIN WITH (FORMAT csv)',
+                    buffer
+                )
+            cursor.execute(
+                f'UPDATE {table} AS i '
+                'SET name = l.name, measurement_unit = l.measurement_unit '
+                'FROM (SELECT DISTINCT name, measurement_unit '
+                '      FROM ingredient_load) AS l '
+                f'WHERE btrim(i.name, {SQL_TRIM}) = l.name '
+                f'AND btrim(i.measurement_unit, {SQL_TRIM}) '
+                '    = l.measurement_unit '
+                'AND (i.name <> l.name '
+                '     OR i.measurement_unit <> l.measurement_unit) '
+                f'AND NOT EXISTS (SELECT 1 FROM {table} AS c '
+                '    WHERE c.name = l.name '
+                '    AND c.measurement_unit = l.measurement_unit) '
+                'RETURNING i.name, i.measurement_unit'
+            )
+            changed = cursor.fetchall()
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT DISTINCT l.name, l.measurement_unit '
+                'FROM ingredient_load AS l '
+                f'WHERE NOT EXISTS (SELECT 1 FROM {table} AS i '
+                f'    WHERE btrim(i.name, {SQL_TRIM}) = l.name '
+                f'    AND btrim(i.measurement_unit, {SQL_TRIM}) '
+                '        = l.measurement_unit) '
+                'RETURNING name, measurement_unit'
+            )
+            created = cursor.fetchall()
+        for row in changed:
+            self.show('~', *row)
+        for row in created:
+            self.show('+', *row)
+        return total, len(created), len(changed)
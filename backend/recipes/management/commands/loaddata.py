@@ -0,0 +1,36 @@
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.commands import loaddata
+
+from recipes.models import FeedEntry
+from users.models import Subscription
+
+# Команды, пересчитывающие данные, которые receiver'ы сигналов
+# поддерживают при обычных изменениях.
+REBUILD_COMMANDS = (
+    ('reconcile_counters',),
+    ('rebuild_shopping_lists',),
+    ('similar_recipes',),
+    ('generate_renditions',),
+    ('update_trending', '--full'),
+)
+
+
+class Command(loaddata.Command):
+    """Загружает фикстуры и пересчитывает производные данные.
+    При загрузке фикстур receiver'ы сигналов ничего не делают
+    (raw=True), поэтому после нее очищается кеш, пересчитываются
+    счетчики, списки покупок, лента подписок, похожие рецепты,
+    уменьшенные копии картинок и баллы популярности."""
+
+    def handle(self, *fixture_labels, **options):
+        super().handle(*fixture_labels, **options)
+        if not self.loaded_object_count:
+            return
+        cache.clear()
+        for name, *args in REBUILD_COMMANDS:
+            call_command(name, *args, stdout=self.stdout)
+        for user_id, author_id in Subscription.objects.values_list(
+            'user_id', 'author_id'
+        ).iterator():
+            FeedEntry.backfill(user_id, author_id)
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, Sum
+
+from recipes.models import RecipeIngredient, ShoppingListItem
+
+
+def get_live_totals():
+    """Агрегирует списки покупок напрямую из рецептов в корзинах."""
+    return RecipeIngredient.objects.filter(
+        recipe__shoppingcart__isnull=False
+    ).values(
+        'ingredient_id', user_id=F('recipe__shoppingcart__user')
+    ).annotate(total=Sum('amount')).order_by()
+
+
+class Command(BaseCommand):
+    """Пересобирает таблицу списков покупок с нуля
+    и сверяет ее с агрегацией по рецептам в корзинах."""
+
+    help = 'Пересобирает и проверяет списки покупок пользователей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check-only',
+            action='store_true',
+            help='Только сверить данные, не пересобирая таблицу.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество записей в одном INSERT.'
+        )
+
+    def handle(self, *args, **options):
+        if not options['check_only']:
+            with transaction.atomic():
+                ShoppingListItem.objects.all().delete()
+                ShoppingListItem.objects.bulk_create(
+                    (
+                        ShoppingListItem(**item)
+                        for item in get_live_totals().iterator()
+                    ),
+                    batch_size=options['batch_size']
+                )
+        expected = {
+            (item['user_id'], item['ingredient_id']): item['total']
+            for item in get_live_totals().iterator()
+        }
+        stored = {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total
+            in ShoppingListItem.objects.values_list(
+                'user_id', 'ingredient_id', 'total'
+            ).iterator()
+        }
+        mismatched = sum(
+            expected.get(key) != stored.get(key)
+            for key in expected.keys() | stored.keys()
+        )
+        if mismatched:
+            raise CommandError(f'Расхождений в списках покупок: {mismatched}')
+        self.stdout.write(f'Списки покупок совпадают: {len(stored)} записей')
@@ -0,0 +1,65 @@
+from django.db import transaction
+from django.db.models import Count
+from django.core.management.base import BaseCommand
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscription, User
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe_id'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe_id'),
+    (User, 'recipes_count', Recipe, 'author_id'),
+    (User, 'followers_count', Subscription, 'author_id'),
+)
+
+
+class Command(BaseCommand):
+    """Пересчитывает денормализованные счетчики и исправляет расхождения.
+    Обрабатывает объекты порциями, каждая порция в своей транзакции."""
+
+    help = (
+        'Сверяет счетчики избранного, списков покупок, рецептов '
+        'и подписчиков.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Количество объектов, обрабатываемых за одну транзакцию.'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        for model, field, related_model, related_field in COUNTERS:
+            fixed = 0
+            last_pk = 0
+            while True:
+                with transaction.atomic():
+                    chunk = list(
+                        model.objects.filter(pk__gt=last_pk).order_by(
+                            'pk'
+                        ).select_for_update().only('pk', field)[:chunk_size]
+                    )
+                    if not chunk:
+                        break
+                    last_pk = chunk[-1].pk
+                    actual = dict(
+                        related_model.objects.filter(**{
+                            f'{related_field}__in': [obj.pk for obj in chunk]
+                        }).order_by().values(related_field).annotate(
+                            total=Count('pk')
+                        ).values_list(related_field, 'total')
+                    )
+                    drifted = []
+                    for obj in chunk:
+                        total = actual.get(obj.pk, 0)
+                        if getattr(obj, field) != total:
+                            setattr(obj, field, total)
+                            drifted.append(obj)
+                    model.objects.bulk_update(drifted, [field])
+                    fixed += len(drifted)
+            self.stdout.write(
+                f'{model.__name__}.{field}: исправлено {fixed}'
+            )
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.similarity import rebuild_similar
+
+
+class Command(BaseCommand):
+    """Вычисляет похожие рецепты по наборам ингредиентов.
+    Кандидаты подбираются MinHash и LSH, среди них выбираются
+    рецепты с наибольшим коэффициентом Жаккара. Между запусками
+    списки обновляются при изменении рецептов."""
+
+    help = 'Заново вычисляет похожие рецепты для всех рецептов.'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        processed = rebuild_similar()
+        self.stdout.write(
+            f'Обработано рецептов: {processed} '
+            f'за {time.monotonic() - started:.1f} с'
+        )
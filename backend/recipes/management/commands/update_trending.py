@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from api.v1.versions import bump
+from recipes.trending import update_trending
+
+
+class Command(BaseCommand):
+    """Обновляет баллы популярности рецептов по добавлениям
+    в избранное и в списки покупок. Рассчитана на периодический
+    запуск (например, из cron раз в несколько минут): каждый запуск
+    учитывает только события с прошлого запуска."""
+
+    help = 'Обновляет баллы популярности рецептов (ordering=trending).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Пересчитать баллы по всем событиям.'
+        )
+
+    def handle(self, *args, **options):
+        updated = update_trending(options['full'])
+        bump('list:trending')
+        self.stdout.write(f'Обновлено рецептов: {updated}')
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_shopping_list_item'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipetag',
+            index=models.Index(fields=['tags', 'recipe'], name='recipes_rec_tags_id_48f67c_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:57
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0008_recipe_image_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageUpload',
+            fields=[
+                ('token', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, verbose_name='Токен')),
+                ('file', models.FileField(upload_to='recipes/uploads/', verbose_name='Файл')),
+                ('content_type', models.CharField(max_length=100, verbose_name='Тип содержимого')),
+                ('size', models.PositiveIntegerField(verbose_name='Размер файла')),
+                ('offset', models.PositiveIntegerField(default=0, verbose_name='Принято байт')),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата создания')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='image_uploads', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Загрузка картинки',
+                'verbose_name_plural': 'Загрузки картинок',
+            },
+        ),
+    ]
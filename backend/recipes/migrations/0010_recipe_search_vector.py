@@ -0,0 +1,30 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:06
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+from recipes.search import create_search_objects, drop_search_objects
+
+
+def create_search(apps, schema_editor):
+    create_search_objects(schema_editor.connection)
+
+
+def drop_search(apps, schema_editor):
+    drop_search_objects(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_image_upload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_search, drop_search),
+    ]
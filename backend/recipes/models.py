@@ -1,7 +1,12 @@
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, RegexValidator
 from django.db import models
 
-from users.models import User
+from users.models import Subscription, User
 
 
 class Recipe(models.Model):
@@ -32,6 +37,12 @@ class Recipe(models.Model):
         upload_to='recipes/images/',
         verbose_name='Картинка'
     )
+    image_renditions = models.TextField(
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name='Уменьшенные копии картинки (JSON)'
+    )
     text = models.TextField(verbose_name='Описание')
     cooking_time = models.PositiveSmallIntegerField(
         validators=[
@@ -47,11 +58,41 @@ class Recipe(models.Model):
         db_index=True,
         verbose_name='Дата публикации'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Добавлений в избранное'
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Добавлений в список покупок'
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор'
+    )
+    trending_score = models.FloatField(
+        default=0,
+        editable=False,
+        verbose_name='Популярность'
+    )
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=['-trending_score', '-id'],
+                name='recipe_trending_idx'
+            )
+        ]
 
     def __str__(self) -> str:
         return self.name
@@ -100,6 +141,9 @@ class RecipeTag(models.Model):
     class Meta:
         verbose_name = 'Тэг рецепта'
         verbose_name_plural = 'Тэги рецептов'
+        indexes = [
+            models.Index(fields=['tags', 'recipe'])
+        ]
 
     def __str__(self):
         return f'{self.recipe} {self.tags}'
@@ -179,6 +223,11 @@ class Favorite(models.Model):
         related_name='favorites',
         verbose_name='Рецепт'
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата добавления'
+    )
 
     class Meta:
         verbose_name = 'Избранное'
@@ -203,6 +252,11 @@ class ShoppingCart(models.Model):
         verbose_name='Пользователь'
     )
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
+    created = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата добавления'
+    )
 
     class Meta:
         verbose_name = 'Список покупок'
@@ -215,3 +269,311 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'{self.user} {self.recipe}'
+
+
+class ShoppingListItem(models.Model):
+    """Модель, хранящая итоговое количество ингредиента
+    в списке покупок пользователя."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент'
+    )
+    total = models.IntegerField(
+        default=0,
+        verbose_name='Общее количество'
+    )
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списка покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_item'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user} {self.ingredient} {self.total}'
+
+    @classmethod
+    def change_totals(cls, recipe_id, deltas, users_ids=None):
+        """Изменяет количество ингредиентов в списках покупок.
+        deltas - словарь {id ингредиента: изменение количества}.
+        По умолчанию затрагивает всех пользователей,
+        у которых рецепт recipe_id находится в списке покупок."""
+        deltas = {
+            ingredient_id: delta
+            for ingredient_id, delta in deltas.items() if delta
+        }
+        if users_ids is None:
+            users_ids = list(ShoppingCart.objects.filter(
+                recipe_id=recipe_id
+            ).values_list('user_id', flat=True))
+        if not deltas or not users_ids:
+            return
+        cls.objects.bulk_create(
+            [
+                cls(user_id=user_id, ingredient_id=ingredient_id)
+                for user_id in users_ids
+                for ingredient_id, delta in deltas.items() if delta > 0
+            ],
+            ignore_conflicts=True
+        )
+        items = cls.objects.filter(
+            user_id__in=users_ids,
+            ingredient_id__in=deltas
+        )
+        items.update(total=models.F('total') + models.Case(
+            *(
+                models.When(ingredient_id=ingredient_id, then=delta)
+                for ingredient_id, delta in deltas.items()
+            ),
+            default=0,
+            output_field=models.IntegerField()
+        ))
+        items.filter(total__lte=0).delete()
+
+
+class FeedEntry(models.Model):
+    """Модель записи ленты подписок: рецепт автора,
+    на которого подписан пользователь. Записи создаются при публикации
+    рецепта. Для авторов, у которых подписчиков больше
+    FEED_FANOUT_LIMIT, записи не создаются: их рецепты лента
+    читает прямо из таблицы рецептов."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Пользователь'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='feed_entry_timeline_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user} {self.recipe}'
+
+    @classmethod
+    def fan_out(cls, recipes):
+        """Добавляет рецепты в ленты подписчиков их авторов."""
+        by_author = defaultdict(list)
+        for recipe in recipes:
+            by_author[recipe.author_id].append(recipe)
+        subscriptions = Subscription.objects.filter(
+            author__in=by_author,
+            author__followers_count__lte=settings.FEED_FANOUT_LIMIT
+        ).values_list('user_id', 'author_id')
+        cls.objects.bulk_create(
+            (
+                cls(user_id=user_id, recipe=recipe, pub_date=recipe.pub_date)
+                for user_id, author_id in subscriptions.iterator()
+                for recipe in by_author[author_id]
+            ),
+            batch_size=1000,
+            ignore_conflicts=True
+        )
+
+    @classmethod
+    def backfill(cls, user_id, author_id):
+        """Добавляет в ленту пользователя уже опубликованные
+        рецепты автора, если автор не из популярных."""
+        if not User.objects.filter(
+            pk=author_id,
+            followers_count__lte=settings.FEED_FANOUT_LIMIT
+        ).exists():
+            return
+        cls.objects.bulk_create(
+            (
+                cls(user_id=user_id, recipe_id=recipe_id, pub_date=pub_date)
+                for recipe_id, pub_date in Recipe.objects.filter(
+                    author_id=author_id
+                ).values_list('pk', 'pub_date').iterator()
+            ),
+            batch_size=1000,
+            ignore_conflicts=True
+        )
+
+    @classmethod
+    def timeline(cls, user_id, limit, position=None):
+        """Возвращает до limit пар (pub_date, id рецепта) из ленты
+        пользователя от новых к старым, начиная после position.
+        Записи ленты объединяются с рецептами популярных авторов."""
+        entries = cls.objects.filter(user_id=user_id)
+        popular = Recipe.objects.filter(
+            author__in=Subscription.objects.filter(
+                user_id=user_id,
+                author__followers_count__gt=settings.FEED_FANOUT_LIMIT
+            ).values('author_id')
+        )
+        if position is not None:
+            pub_date, pk = position
+            entries = entries.filter(
+                models.Q(pub_date__lt=pub_date)
+                | models.Q(pub_date=pub_date, recipe_id__lt=pk)
+            )
+            popular = popular.filter(
+                models.Q(pub_date__lt=pub_date)
+                | models.Q(pub_date=pub_date, pk__lt=pk)
+            )
+        merged = set(entries.order_by('-pub_date', '-recipe_id').values_list(
+            'pub_date', 'recipe_id'
+        )[:limit])
+        merged.update(popular.order_by('-pub_date', '-pk').values_list(
+            'pub_date', 'pk'
+        )[:limit])
+        return sorted(merged, reverse=True)[:limit]
+
+
+class RecipeBand(models.Model):
+    """Модель корзины LSH: ключ одной полосы MinHash-сигнатуры
+    рецепта. Рецепты с совпадающим ключом хотя бы в одной полосе -
+    кандидаты в похожие."""
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='bands',
+        verbose_name='Рецепт'
+    )
+    band = models.PositiveSmallIntegerField(verbose_name='Полоса')
+    key = models.BigIntegerField(verbose_name='Ключ')
+
+    class Meta:
+        verbose_name = 'Корзина LSH'
+        verbose_name_plural = 'Корзины LSH'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'band'],
+                name='unique_recipe_band'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['band', 'key'],
+                name='recipe_band_key_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} {self.band} {self.key}'
+
+
+class SimilarRecipe(models.Model):
+    """Модель похожего рецепта с коэффициентом Жаккара
+    по наборам ингредиентов."""
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_recipes',
+        verbose_name='Рецепт'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_to',
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField(verbose_name='Сходство')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_similar_recipe'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipe', '-score'],
+                name='similar_recipe_score_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} {self.similar} {self.score:.2f}'
+
+
+class ImageUpload(models.Model):
+    """Модель загрузки картинки рецепта отдельным запросом.
+    Файл принимается целиком или частями, после чего токен
+    передается в поле image рецепта вместо строки base64."""
+
+    token = models.UUIDField(
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False,
+        verbose_name='Токен'
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='image_uploads',
+        verbose_name='Пользователь'
+    )
+    file = models.FileField(
+        upload_to='recipes/uploads/',
+        verbose_name='Файл'
+    )
+    content_type = models.CharField(
+        max_length=100,
+        verbose_name='Тип содержимого'
+    )
+    size = models.PositiveIntegerField(verbose_name='Размер файла')
+    offset = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Принято байт'
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата создания'
+    )
+
+    class Meta:
+        verbose_name = 'Загрузка картинки'
+        verbose_name_plural = 'Загрузки картинок'
+
+    def __str__(self):
+        return f'{self.user} {self.token}'
+
+    @property
+    def is_complete(self):
+        return self.offset == self.size
+
+    def discard(self):
+        """Удаляет загрузку вместе с файлом."""
+        self.file.delete(save=False)
+        self.delete()
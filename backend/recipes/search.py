@@ -0,0 +1,149 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import F
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+
+POSTGRESQL_CREATE = (
+    f"""
+    CREATE OR REPLACE FUNCTION recipes_recipe_search_vector_update()
+    RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('{SEARCH_CONFIG}',
+                                  coalesce(NEW.name, '')), 'A')
+            || setweight(to_tsvector('{SEARCH_CONFIG}',
+                                     coalesce(NEW.text, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    DROP TRIGGER IF EXISTS recipes_recipe_search_vector_trigger
+    ON recipes_recipe
+    """,
+    """
+    CREATE TRIGGER recipes_recipe_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe
+    FOR EACH ROW EXECUTE PROCEDURE recipes_recipe_search_vector_update()
+    """,
+    'UPDATE recipes_recipe SET name = name',
+    """
+    CREATE INDEX IF NOT EXISTS recipes_recipe_search_vector_gin
+    ON recipes_recipe USING gin (search_vector)
+    """,
+)
+
+POSTGRESQL_DROP = (
+    'DROP INDEX IF EXISTS recipes_recipe_search_vector_gin',
+    """
+    DROP TRIGGER IF EXISTS recipes_recipe_search_vector_trigger
+    ON recipes_recipe
+    """,
+    'DROP FUNCTION IF EXISTS recipes_recipe_search_vector_update()',
+)
+
+SQLITE_CREATE = (
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, text, content='recipes_recipe', content_rowid='id'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert
+    AFTER INSERT ON recipes_recipe BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete
+    AFTER DELETE ON recipes_recipe BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update
+    AFTER UPDATE OF name, text ON recipes_recipe BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+        INSERT INTO {FTS_TABLE} (rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+    f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')",
+)
+
+SQLITE_DROP = (
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_insert',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_delete',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_update',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+)
+
+STATEMENTS = {
+    'postgresql': (POSTGRESQL_CREATE, POSTGRESQL_DROP),
+    'sqlite': (SQLITE_CREATE, SQLITE_DROP),
+}
+
+
+def _execute(connection, statements):
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def create_search_objects(connection):
+    """Создает триггеры и индекс полнотекстового поиска и заполняет их.
+    Повторный вызов безопасен: на SQLite он нужен после миграций,
+    которые пересоздают таблицу рецептов вместе с ее триггерами."""
+    if connection.vendor in STATEMENTS:
+        _execute(connection, STATEMENTS[connection.vendor][0])
+
+
+def drop_search_objects(connection):
+    if connection.vendor in STATEMENTS:
+        _execute(connection, STATEMENTS[connection.vendor][1])
+
+
+def get_fts5_query(text):
+    """Экранирует слова запроса для FTS5: каждое слово ищется
+    как префикс, все слова должны встретиться в рецепте."""
+    return ' '.join(
+        '"{0}"*'.format(word.replace('"', '""')) for word in text.split()
+    )
+
+
+def search_recipes(queryset, text):
+    """Оставляет рецепты, подходящие под поисковый запрос,
+    и упорядочивает их по релевантности (поле search_rank).
+    На PostgreSQL использует tsvector с русской морфологией,
+    на SQLite - таблицу FTS5."""
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        query = SearchQuery(text, config=SEARCH_CONFIG)
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query)
+        ).order_by('-search_rank', '-pub_date')
+    if vendor == 'sqlite':
+        match = get_fts5_query(text)
+        if not match:
+            return queryset
+        # RawSQL в id__in оборачивается во вторые скобки, и SQLite
+        # считает подзапрос скалярным, поэтому условие задается через extra.
+        return queryset.extra(
+            where=[
+                f'recipes_recipe.id IN (SELECT rowid FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s)'
+            ],
+            params=[match]
+        ).annotate(search_rank=RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, 10.0, 5.0) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s '
+            f'AND {FTS_TABLE}.rowid = recipes_recipe.id',
+            (match,)
+        )).order_by('-search_rank', '-pub_date')
+    return queryset.filter(name__icontains=text)
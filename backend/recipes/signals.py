@@ -0,0 +1,205 @@
+from collections import Counter
+
+from django.db import connections
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import (
+    post_delete,
+    post_migrate,
+    post_save,
+    pre_save
+)
+from django.dispatch import receiver
+
+from users.models import Subscription, User
+from .images import schedule_renditions
+from .search import FTS_TABLE, create_search_objects
+from .similarity import schedule_similar
+from .trending import discard_event
+from .models import (
+    Favorite,
+    FeedEntry,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    ShoppingListItem
+)
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарно изменяет счетчик на delta с помощью F-выражения.
+    Счетчик не опускается ниже нуля, даже если успел разойтись
+    с данными: поля счетчиков положительные."""
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_created(sender, instance, created, **kwargs):
+    if kwargs.get('raw'):
+        return
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def favorite_deleted(sender, instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'favorites_count', -1)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_created(sender, instance, created, **kwargs):
+    if kwargs.get('raw'):
+        return
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'in_carts_count', 1)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def shopping_cart_deleted(sender, instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'in_carts_count', -1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def trending_event_deleted(sender, instance, **kwargs):
+    discard_event(sender, instance)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if kwargs.get('raw'):
+        return
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_feed_fan_out(sender, instance, created, **kwargs):
+    if kwargs.get('raw'):
+        return
+    if created:
+        FeedEntry.fan_out([instance])
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_created(sender, instance, created, **kwargs):
+    if kwargs.get('raw'):
+        return
+    if created:
+        change_counter(User, instance.author_id, 'followers_count', 1)
+        FeedEntry.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(sender, instance, **kwargs):
+    change_counter(User, instance.author_id, 'followers_count', -1)
+    FeedEntry.objects.filter(
+        user_id=instance.user_id,
+        recipe__author_id=instance.author_id
+    ).delete()
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(sender, instance, update_fields=None, **kwargs):
+    if kwargs.get('raw'):
+        return
+    if update_fields is None or 'image' in update_fields:
+        schedule_renditions(instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_similar_saved(sender, instance, update_fields=None, **kwargs):
+    if kwargs.get('raw'):
+        return
+    if update_fields is None:
+        schedule_similar(instance.pk)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+def get_recipe_amounts(recipe_id):
+    """Возвращает словарь {id ингредиента: количество} для рецепта."""
+    return dict(RecipeIngredient.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('ingredient_id', 'amount'))
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_list_add_recipe(sender, instance, created, **kwargs):
+    if kwargs.get('raw'):
+        return
+    if created:
+        ShoppingListItem.change_totals(
+            instance.recipe_id,
+            get_recipe_amounts(instance.recipe_id),
+            users_ids=[instance.user_id]
+        )
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def shopping_list_remove_recipe(sender, instance, **kwargs):
+    ShoppingListItem.change_totals(
+        instance.recipe_id,
+        {
+            ingredient_id: -amount
+            for ingredient_id, amount
+            in get_recipe_amounts(instance.recipe_id).items()
+        },
+        users_ids=[instance.user_id]
+    )
+
+
+@receiver(pre_save, sender=RecipeIngredient)
+def recipe_ingredient_remember(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    instance._previous = None
+    if instance.pk is not None:
+        instance._previous = RecipeIngredient.objects.filter(
+            pk=instance.pk
+        ).values_list('ingredient_id', 'amount').first()
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def recipe_ingredient_saved(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    deltas = Counter({instance.ingredient_id: instance.amount})
+    if getattr(instance, '_previous', None) is not None:
+        ingredient_id, amount = instance._previous
+        deltas[ingredient_id] -= amount
+    ShoppingListItem.change_totals(instance.recipe_id, deltas)
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_deleted(sender, instance, **kwargs):
+    ShoppingListItem.change_totals(
+        instance.recipe_id,
+        {instance.ingredient_id: -instance.amount}
+    )
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_similar(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    schedule_similar(instance.recipe_id)
+
+
+@receiver(post_migrate)
+def search_objects_restore(sender, using, **kwargs):
+    """На SQLite миграции пересоздают таблицу рецептов без ее триггеров,
+    поэтому после миграций триггеры поиска создаются заново."""
+    connection = connections[using]
+    if (
+        sender.name == 'recipes'
+        and connection.vendor == 'sqlite'
+        and FTS_TABLE in connection.introspection.table_names()
+    ):
+        create_search_objects(connection)
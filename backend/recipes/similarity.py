@@ -0,0 +1,221 @@
+import logging
+from array import array
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, reduce
+from hashlib import blake2b
+from operator import or_
+from random import Random
+from threading import Lock
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Q
+
+from .models import RecipeBand, RecipeIngredient, SimilarRecipe
+
+logger = logging.getLogger(__name__)
+
+HASHES = 64
+# 16 полос по 4 значения: рецепты с коэффициентом Жаккара от 0.5
+# попадают в общую корзину с вероятностью больше 60%.
+BAND_SIZE = 4
+PRIME = (1 << 61) - 1
+# Корзины из тысяч рецептов с самыми частыми ингредиентами
+# не дают полезных кандидатов и пропускаются.
+MAX_BUCKET_SIZE = 500
+BATCH_SIZE = 1000
+
+_random = Random(HASHES)
+COEFFICIENTS = tuple(
+    (_random.randrange(1, PRIME), _random.randrange(PRIME))
+    for _ in range(HASHES)
+)
+
+executor = ThreadPoolExecutor(
+    max_workers=1,
+    thread_name_prefix='recipe-similarity'
+)
+_pending = set()
+_lock = Lock()
+
+
+@lru_cache(maxsize=None)
+def get_ingredient_hashes(ingredient_id):
+    """Значения всех хеш-функций вида (a * x + b) mod p для ингредиента."""
+    return tuple((a * ingredient_id + b) % PRIME for a, b in COEFFICIENTS)
+
+
+def get_signature(ingredients_ids):
+    """MinHash-сигнатура набора ингредиентов: поэлементный минимум
+    хешей ингредиентов, вычисляемый встроенными map и min."""
+    hashes = [get_ingredient_hashes(pk) for pk in ingredients_ids]
+    if len(hashes) == 1:
+        return hashes[0]
+    return tuple(map(min, *hashes))
+
+
+def get_band_keys(signature):
+    """Ключи корзин LSH для полос сигнатуры."""
+    return [
+        int.from_bytes(blake2b(
+            array('Q', signature[start:start + BAND_SIZE]).tobytes(),
+            digest_size=8
+        ).digest(), 'big') >> 1
+        for start in range(0, HASHES, BAND_SIZE)
+    ]
+
+
+def get_top_similar(recipe_id, ingredients, candidates):
+    """Возвращает до SIMILAR_RECIPES_COUNT пар (сходство, id рецепта)
+    из candidates - словаря {id рецепта: множество ингредиентов}."""
+    scores = []
+    for candidate_id, candidate in candidates.items():
+        if candidate_id == recipe_id:
+            continue
+        common = len(ingredients & candidate)
+        if common:
+            scores.append((
+                common / (len(ingredients) + len(candidate) - common),
+                candidate_id
+            ))
+    scores.sort(reverse=True)
+    return scores[:settings.SIMILAR_RECIPES_COUNT]
+
+
+def get_contents(recipes_ids=None):
+    """Возвращает словарь {id рецепта: множество id ингредиентов}."""
+    rows = RecipeIngredient.objects.order_by()
+    if recipes_ids is not None:
+        rows = rows.filter(recipe_id__in=recipes_ids)
+    contents = defaultdict(set)
+    for recipe_id, ingredient_id in rows.values_list(
+        'recipe_id', 'ingredient_id'
+    ).iterator():
+        contents[recipe_id].add(ingredient_id)
+    return contents
+
+
+def rebuild_similar():
+    """Заново вычисляет корзины LSH и похожие рецепты для всех рецептов.
+    Возвращает количество обработанных рецептов."""
+    contents = get_contents()
+    bands = {}
+    buckets = defaultdict(list)
+    for recipe_id, ingredients in contents.items():
+        bands[recipe_id] = get_band_keys(get_signature(ingredients))
+        for band, key in enumerate(bands[recipe_id]):
+            buckets[band, key].append(recipe_id)
+    with transaction.atomic():
+        RecipeBand.objects.all().delete()
+        RecipeBand.objects.bulk_create(
+            (
+                RecipeBand(recipe_id=recipe_id, band=band, key=key)
+                for recipe_id, keys in bands.items()
+                for band, key in enumerate(keys)
+            ),
+            batch_size=BATCH_SIZE
+        )
+        SimilarRecipe.objects.all().delete()
+        rows = []
+        for recipe_id, keys in bands.items():
+            candidates = set()
+            for band, key in enumerate(keys):
+                bucket = buckets[band, key]
+                if len(bucket) <= MAX_BUCKET_SIZE:
+                    candidates.update(bucket)
+            for score, similar_id in get_top_similar(
+                recipe_id,
+                contents[recipe_id],
+                {pk: contents[pk] for pk in candidates}
+            ):
+                rows.append(SimilarRecipe(
+                    recipe_id=recipe_id,
+                    similar_id=similar_id,
+                    score=score
+                ))
+            if len(rows) >= BATCH_SIZE:
+                SimilarRecipe.objects.bulk_create(rows)
+                rows = []
+        SimilarRecipe.objects.bulk_create(rows)
+    return len(contents)
+
+
+def update_similar(recipes_ids):
+    """Пересчитывает корзины и похожие рецепты для измененных рецептов.
+    Рецепты добавляются и в списки своих соседей; лишние записи
+    этих списков убираются при следующем полном пересчете."""
+    contents = get_contents(recipes_ids)
+    with transaction.atomic():
+        RecipeBand.objects.filter(recipe_id__in=recipes_ids).delete()
+        SimilarRecipe.objects.filter(
+            Q(recipe_id__in=recipes_ids) | Q(similar_id__in=recipes_ids)
+        ).delete()
+        bands = {
+            recipe_id: get_band_keys(get_signature(ingredients))
+            for recipe_id, ingredients in contents.items()
+        }
+        RecipeBand.objects.bulk_create(
+            RecipeBand(recipe_id=recipe_id, band=band, key=key)
+            for recipe_id, keys in bands.items()
+            for band, key in enumerate(keys)
+        )
+        rows = []
+        for recipe_id, keys in bands.items():
+            buckets = RecipeBand.objects.filter(reduce(or_, (
+                Q(band=band, key=key) for band, key in enumerate(keys)
+            )))
+            small = [
+                Q(band=band, key=key)
+                for band, key, size in buckets.values_list(
+                    'band', 'key'
+                ).annotate(size=Count('pk')).order_by()
+                if size <= MAX_BUCKET_SIZE
+            ]
+            if not small:
+                continue
+            candidates = get_contents(RecipeBand.objects.filter(
+                reduce(or_, small)
+            ).values('recipe_id'))
+            for score, similar_id in get_top_similar(
+                recipe_id, contents[recipe_id], candidates
+            ):
+                rows.append(SimilarRecipe(
+                    recipe_id=recipe_id,
+                    similar_id=similar_id,
+                    score=score
+                ))
+                rows.append(SimilarRecipe(
+                    recipe_id=similar_id,
+                    similar_id=recipe_id,
+                    score=score
+                ))
+        SimilarRecipe.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+def update_similar_in_pool():
+    """Выполняется в потоке пула: обрабатывает накопившиеся рецепты
+    одним пересчетом и закрывает соединение потока с базой."""
+    with _lock:
+        recipes_ids = list(_pending)
+        _pending.clear()
+    try:
+        update_similar(recipes_ids)
+    except Exception:
+        logger.exception('Не удалось обновить похожие рецепты %s',
+                         recipes_ids)
+    finally:
+        connection.close()
+
+
+def schedule_similar(recipe_id):
+    """Ставит пересчет похожих рецептов в очередь пула
+    после фиксации текущей транзакции."""
+    def submit():
+        with _lock:
+            idle = not _pending
+            _pending.add(recipe_id)
+        if idle:
+            executor.submit(update_similar_in_pool)
+
+    transaction.on_commit(submit)
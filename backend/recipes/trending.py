@@ -0,0 +1,113 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
+from django.utils import timezone
+
+from .models import Favorite, Recipe, ShoppingCart
+
+# Баллы считаются с прямым затуханием: вес события растет вдвое
+# каждые TRENDING_HALF_LIFE_HOURS от точки отсчета. Порядок рецептов
+# такой же, как у баллов, затухающих от текущего момента, но старые
+# баллы не нужно пересчитывать при каждом обновлении. Чтобы степень
+# не переполняла float, точка отсчета переносится на текущий момент,
+# когда до него проходит REBASE_HALF_LIVES периодов полураспада;
+# сохраненные баллы при этом уменьшаются в том же масштабе.
+REBASE_HALF_LIVES = 64
+# Добавление в список покупок говорит о намерении приготовить
+# рецепт и весит больше добавления в избранное.
+WEIGHTS = {
+    Favorite: 1.0,
+    ShoppingCart: 2.0,
+}
+SYNCED_AT_KEY = 'trending:synced_at'
+EPOCH_KEY = 'trending:epoch'
+# События последних секунд пропускаются до следующего запуска:
+# их транзакции могут быть еще не зафиксированы.
+SYNC_LAG = timedelta(seconds=30)
+BATCH_SIZE = 500
+
+
+def get_half_lives(start, end):
+    """Количество периодов полураспада между двумя моментами."""
+    return (end - start).total_seconds() / (
+        settings.TRENDING_HALF_LIFE_HOURS * 3600
+    )
+
+
+def get_event_score(model, created, epoch):
+    return WEIGHTS[model] * 2 ** get_half_lives(epoch, created)
+
+
+def add_scores(deltas):
+    """Прибавляет к баллам рецептов значения из словаря
+    {id рецепта: прибавка} порциями по BATCH_SIZE рецептов."""
+    deltas = list(deltas.items())
+    for start in range(0, len(deltas), BATCH_SIZE):
+        batch = dict(deltas[start:start + BATCH_SIZE])
+        Recipe.objects.filter(pk__in=batch).update(
+            trending_score=models.F('trending_score') + models.Case(
+                *(
+                    models.When(pk=recipe_id, then=models.Value(delta))
+                    for recipe_id, delta in batch.items()
+                ),
+                default=models.Value(0.0),
+                output_field=models.FloatField()
+            )
+        )
+
+
+def update_trending(full=False):
+    """Добавляет к баллам рецептов события, появившиеся с прошлого
+    запуска. При full или без меток прошлого запуска баллы
+    вычисляются заново по всем событиям.
+    Возвращает количество рецептов с новыми событиями."""
+    now = timezone.now()
+    synced_at = now - SYNC_LAG
+    stored = {} if full else cache.get_many([SYNCED_AT_KEY, EPOCH_KEY])
+    since = stored.get(SYNCED_AT_KEY)
+    epoch = stored.get(EPOCH_KEY)
+    deltas = defaultdict(float)
+    with transaction.atomic():
+        if since is None or epoch is None:
+            since = None
+            epoch = now
+            Recipe.objects.exclude(trending_score=0).update(trending_score=0)
+        elif get_half_lives(epoch, now) > REBASE_HALF_LIVES:
+            Recipe.objects.exclude(trending_score=0).update(
+                trending_score=models.F('trending_score') * models.Value(
+                    2 ** -get_half_lives(epoch, now),
+                    output_field=models.FloatField()
+                )
+            )
+            epoch = now
+        for model in WEIGHTS:
+            events = model.objects.filter(created__lte=synced_at)
+            if since is not None:
+                events = events.filter(created__gt=since)
+            for recipe_id, created in events.values_list(
+                'recipe_id', 'created'
+            ).iterator():
+                deltas[recipe_id] += get_event_score(model, created, epoch)
+        add_scores(deltas)
+    cache.set_many({SYNCED_AT_KEY: synced_at, EPOCH_KEY: epoch}, timeout=None)
+    return len(deltas)
+
+
+def discard_event(model, instance):
+    """Вычитает из баллов рецепта удаленное событие,
+    если оно уже было учтено."""
+    stored = cache.get_many([SYNCED_AT_KEY, EPOCH_KEY])
+    synced_at = stored.get(SYNCED_AT_KEY)
+    epoch = stored.get(EPOCH_KEY)
+    if (
+        synced_at is not None and epoch is not None
+        and instance.created <= synced_at
+    ):
+        add_scores({
+            instance.recipe_id: -get_event_score(
+                model, instance.created, epoch
+            )
+        })
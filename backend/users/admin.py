@@ -14,7 +14,8 @@ class UserAdmin(admin.ModelAdmin):
         'email',
         'first_name',
         'last_name',
-        'username'
+        'username',
+        'recipes_count'
     )
     search_fields = (
         'username',